@@ -0,0 +1,162 @@
+"""
+Headless batch-export van alle call flows, zonder Streamlit.
+
+Leest een 3CX-export (ZIP) met dezelfde ingest als de app, bouwt alle flows per
+Onderdeel en per individuele DR, en schrijft per flow een `.dot` bestand, een
+`.json` (knopen en pijlen, zie `graph_viewer`), een `.svg` (gerenderd in een
+process pool over alle CPU-cores) en de gebruikers-CSV. Met `--html` komt er per
+flow ook een zelfstandige HTML-pagina met de interactieve viewer bij.
+Daarnaast worden de tabellen 'Users per Onderdeel' en 'DRs per User' als CSV
+weggeschreven.
+
+Gebruik:
+    python batch_export.py export.zip -o uitvoer/ [--workers N] [--no-svg] [--html] [--trace trace.json]
+                           [--max-leden 15] [--max-diepte 3] [--max-knopen 150]
+
+Standaard worden de flows volledig uitgeschreven; met de `--max-*` opties worden
+grote wachtrijen en diepe sub-flows ingeklapt zoals in de app.
+"""
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import replace
+
+import graphviz
+
+import ingest
+import instrument
+import render
+from graph_viewer import graph_json, viewer_html
+from callgraph import split_receptionists_by_onderdeel
+from flows import (DetailLevel, build_onderdeel_flow, build_individual_flow, flow_to_dot, individual_flow_context,
+                   onderdeel_safe_name, users_flow_csv)
+from reachability import build_users_per_onderdeel, build_user_reachability_data
+
+logger = logging.getLogger("batch_export")
+
+
+def render_svg(dot_source, svg_path):
+    """
+    Rendert één DOT-bron naar SVG via de gedeelde schijfcache (draait in een worker-proces).
+    Returns: tuple (svg_path, foutmelding of None)
+    """
+    try:
+        svg = render.render_svg(dot_source)
+    except graphviz.ExecutableNotFound:
+        return svg_path, "Graphviz 'dot' niet gevonden op het PATH"
+    except Exception as e:
+        return svg_path, str(e)
+    with open(svg_path, 'wb') as f:
+        f.write(svg)
+    return svg_path, None
+
+
+def collect_flows(all_data, detail=None):
+    """
+    Bouwt alle flows zoals tab 1 van de app ze toont.
+    detail: optioneel DetailLevel (level-of-detail); zonder wordt alles uitgeschreven.
+    Returns: lijst van (bestandsnaam zonder extensie, Flow)
+    """
+    receptionists_df_all = all_data.get("receptionists_all")
+    if receptionists_df_all is None or receptionists_df_all.empty or 'Onderdeel' not in receptionists_df_all.columns:
+        return []
+    drs_met_geldig_onderdeel, drs_zonder_geldig_onderdeel, _ = split_receptionists_by_onderdeel(receptionists_df_all)
+
+    def flow_data():
+        # Per flow een eigen DetailLevel, net als in telephony.py: `folded` wordt tijdens het bouwen gevuld
+        return all_data if detail is None else dict(all_data, detail=replace(detail, folded=set()))
+
+    flows = []
+    used = set()  # Al gebruikte bestandsnamen: 'A B', 'A-B' en 'A/B' worden allemaal 'A_B'
+
+    def unique(base_name):
+        name, n = base_name, 1
+        while name in used:
+            n += 1
+            name = f"{base_name}_{n}"
+        used.add(name)
+        return name
+
+    for onderdeel_naam, onderdeel_group_df in drs_met_geldig_onderdeel.groupby('Onderdeel'):
+        flows.append((unique(f"onderdeel_{onderdeel_safe_name(onderdeel_naam)}"), build_onderdeel_flow(onderdeel_naam, onderdeel_group_df, flow_data())))
+    for _, dr in drs_zonder_geldig_onderdeel.iterrows():
+        context = individual_flow_context(dr)
+        if context is None: continue
+        flows.append((unique(f"IVR_{context[1]}"), build_individual_flow(dr, flow_data())))
+    return flows
+
+
+def export_all(zip_path, output_dir, workers=None, svg=True, detail=None, html=False):
+    """Schrijft alle flows en tabellen naar `output_dir`. Returns: aantal mislukte SVG-renders."""
+    with open(zip_path, 'rb') as f:
+        all_data = ingest.load_snapshot(f.read())
+    if not all_data:
+        raise SystemExit(f"Kon {zip_path} niet inlezen.")
+    os.makedirs(output_dir, exist_ok=True)
+
+    flows = collect_flows(all_data, detail)
+    render_jobs = []
+    for base_name, flow in flows:
+        dot = flow_to_dot(flow)
+        dot_path = os.path.join(output_dir, f"{base_name}.dot")
+        with open(dot_path, 'w', encoding='utf-8') as f:
+            f.write(dot.source)
+        with open(os.path.join(output_dir, f"{base_name}.json"), 'w', encoding='utf-8') as f:
+            f.write(graph_json(flow))
+        if html:
+            with open(os.path.join(output_dir, f"{base_name}.html"), 'w', encoding='utf-8') as f:
+                f.write(viewer_html(flow))
+        if flow.users:
+            csv_bytes, _ = users_flow_csv(flow.users)
+            with open(os.path.join(output_dir, f"users_in_flow_{base_name}.csv"), 'wb') as f:
+                f.write(csv_bytes)
+        render_jobs.append((dot.source, os.path.join(output_dir, f"{base_name}.svg")))
+    logger.info("%d flows geschreven naar %s", len(flows), output_dir)
+
+    build_users_per_onderdeel(all_data).to_csv(os.path.join(output_dir, "users_per_onderdeel.csv"), index=False)
+    build_user_reachability_data(all_data).to_csv(os.path.join(output_dir, "drs_per_user.csv"), index=False)
+
+    failures = 0
+    if svg and render_jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_svg, source, path) for source, path in render_jobs]
+            for future in as_completed(futures):
+                svg_path, error = future.result()
+                if error:
+                    failures += 1
+                    logger.error("Renderen van %s mislukt: %s", os.path.basename(svg_path), error)
+        logger.info("%d van %d SVG's gerenderd", len(render_jobs) - failures, len(render_jobs))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporteer alle 3CX call flows (DOT/SVG/CSV) zonder de Streamlit UI.")
+    parser.add_argument("zip", help="ZIP-bestand met de 3CX CSV-exports")
+    parser.add_argument("-o", "--output", default="export", help="Uitvoermap (standaard: ./export)")
+    parser.add_argument("--workers", type=int, default=None, help="Aantal render-processen (standaard: aantal CPU-cores)")
+    parser.add_argument("--no-svg", action="store_true", help="Alleen DOT, JSON en CSV schrijven, niet renderen")
+    parser.add_argument("--html", action="store_true", help="Per flow ook een HTML-pagina met de interactieve viewer schrijven")
+    parser.add_argument("--trace", help="Schrijf de tijden per stap als JSON-trace (Chrome trace-formaat) naar dit bestand")
+    parser.add_argument("--max-leden", type=int, help="Wachtrijen/belgroepen met meer leden tonen alleen aantallen")
+    parser.add_argument("--max-diepte", type=int, help="DR's dieper dan dit niveau worden ingeklapt")
+    parser.add_argument("--max-knopen", type=int, help="Na zoveel knopen per flow worden verdere DR's ingeklapt")
+    args = parser.parse_args(argv)
+    detail = None
+    if args.max_leden is not None or args.max_diepte is not None or args.max_knopen is not None:
+        detail = DetailLevel(max_members=args.max_leden, max_depth=args.max_diepte, max_nodes=args.max_knopen)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    trace = instrument.Trace() if args.trace else None
+    with instrument.tracing(trace):
+        failures = export_all(args.zip, args.output, workers=args.workers, svg=not args.no_svg, detail=detail, html=args.html)
+    if trace is not None:
+        with open(args.trace, 'w', encoding='utf-8') as f:
+            f.write(trace.to_json())
+        logger.info("Trace geschreven naar %s", args.trace)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
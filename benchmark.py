@@ -0,0 +1,189 @@
+"""
+Benchmark van alle pijplijn-stappen op synthetische exports (zie `synth_export`).
+
+Per schaal (standaard 1x, 10x en 100x) wordt één export gegenereerd en worden
+de stappen een aantal keer getimed: inlezen (`load_data_from_zip`), het parsen
+van alle bestemmingen (koude parser-cache), nummerblok-lookups per nummer, het
+opbouwen van alle flows (DOT, zonder renderen; volledig en met het standaard
+detailniveau van de app), `find_reachable_users` per
+Onderdeel, de tabellen van tab 2 en 3 en het filteren van tab 3 (`FilterIndex`).
+De resultaten gaan als JSON naar `--output`; met `--baseline` worden ze vergeleken met een eerdere run en worden
+stappen die trager zijn dan `--threshold` gemarkeerd.
+
+Gebruik:
+    python benchmark.py [--scales 1 10 100] [--repeat 3] [-o benchmark.json] [--baseline oud.json]
+"""
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import batch_export
+import ingest
+from callgraph import DR_DESTINATION_COLUMNS, _parse_destination_cached, parse_destination, split_receptionists_by_onderdeel
+from filter_index import FilterIndex
+from flows import DETAIL_MAX_DEPTH, DETAIL_MAX_MEMBERS, DETAIL_MAX_NODES, DetailLevel
+from nummers import find_nummerblok_for_number
+from reachability import build_user_reachability_data, build_users_per_onderdeel, find_reachable_users
+from synth_export import ExportShape, generate_export
+
+logger = logging.getLogger("benchmark")
+
+DRS_PER_USER_FILTERS = ["User Name", "User Department", "Onderdeel", "Reached Via Type", "Nummerblok(ken) DID", "Nummerblok OutboundCID"]
+
+
+def _destination_strings(all_data):
+    """Alle bestemming-strings uit DR's, wachtrijen en belgroepen, zoals de ingest ze parseert."""
+    strings = []
+    receptionists = all_data.get("receptionists_all", pd.DataFrame())
+    for col in DR_DESTINATION_COLUMNS:
+        if col in receptionists.columns:
+            strings.extend(receptionists[col].dropna())
+    for key in ("queues", "ringgroups"):
+        df = all_data.get(key)
+        if df is not None and "Destination if no answer" in df.columns:
+            strings.extend(df["Destination if no answer"].dropna())
+    return strings
+
+
+def _phone_numbers(all_data):
+    """Alle DID's en OutboundCallerID's van de gebruikers (de invoer van de nummerblok-lookups)."""
+    users = all_data["users"]
+    numbers = []
+    if "DID" in users.columns:
+        numbers.extend(part.strip() for did in users["DID"].dropna() for part in did.split(":"))
+    if "OutboundCallerID" in users.columns:
+        numbers.extend(users["OutboundCallerID"].dropna())
+    return numbers
+
+
+def _onderdeel_starts(all_data):
+    """Start-bestemmingen per Onderdeel, zoals `build_users_per_onderdeel` ze verzamelt."""
+    receptionists_met_onderdeel, _, _ = split_receptionists_by_onderdeel(all_data["receptionists_all"])
+    dest_cols = [col for col in DR_DESTINATION_COLUMNS if col in receptionists_met_onderdeel.columns]
+    return [[str(value) for col in dest_cols for value in groep[col] if pd.notna(value) and str(value).strip()]
+            for _, groep in receptionists_met_onderdeel.groupby("Onderdeel")]
+
+
+def _time(func, repeat):
+    """Returns: (laatste resultaat, lijst van looptijden in seconden)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def _parse_all_cold(strings):
+    _parse_destination_cached.cache_clear()
+    for dest_string in strings:
+        parse_destination(dest_string)
+    return len(strings)
+
+
+def run_scale(scale, repeat=3, seed=0):
+    """
+    Genereert een export op de gegeven schaal en timet elke stap.
+    Returns: dict met de schaal, de aantallen records en per stap de looptijden
+    """
+    zip_bytes, counts = generate_export(ExportShape(scale=scale), seed=seed)
+    stages = {}
+
+    def record(name, func, items_of=None):
+        result, timings = _time(func, repeat)
+        stages[name] = {"min_s": min(timings), "median_s": statistics.median(timings), "runs": timings}
+        if items_of is not None:
+            stages[name]["items"] = items_of(result)
+        logger.info("%6gx %-30s %8.4f s", scale, name, min(timings))
+        return result
+
+    all_data = record("load_data_from_zip", lambda: ingest.load_data_from_zip(zip_bytes, report=lambda *_: None))
+    if not all_data:
+        raise RuntimeError(f"Synthetische export op schaal {scale} kon niet worden ingelezen")
+
+    strings = _destination_strings(all_data)
+    record("parse_destination", lambda: _parse_all_cold(strings), items_of=lambda n: n)
+
+    numbers, index = _phone_numbers(all_data), all_data["nummerblok_index"]
+    record("find_nummerblok_for_number", lambda: [find_nummerblok_for_number(n, index) for n in numbers], items_of=len)
+
+    record("build_flows", lambda: batch_export.collect_flows(all_data), items_of=len)
+    # Level-of-detail: items = grootste aantal knopen in één flow (bepaalt de layouttijd)
+    record("build_flows_detail",
+           lambda: batch_export.collect_flows(all_data, DetailLevel(DETAIL_MAX_MEMBERS, DETAIL_MAX_DEPTH, DETAIL_MAX_NODES)),
+           items_of=lambda flows: max((flow.n_nodes for _, flow in flows), default=0))
+
+    starts = _onderdeel_starts(all_data)
+    record("find_reachable_users", lambda: [find_reachable_users(s, all_data) for s in starts],
+           items_of=lambda sets: sum(map(len, sets)))
+    record("build_users_per_onderdeel", lambda: build_users_per_onderdeel(all_data), items_of=len)
+    table = record("build_user_reachability_data", lambda: build_user_reachability_data(all_data), items_of=len)
+    # Filters van tab 3: index opbouwen (eenmalig, gecachet) en een filterklik (items = rijen in het resultaat)
+    filter_index = record("filter_index", lambda: FilterIndex(table, DRS_PER_USER_FILTERS), items_of=lambda index: index.n_rows)
+    selectie = {col: filter_index.options(col)[:2] for col in ("User Department", "Onderdeel")}
+    record("filter_select", lambda: filter_index.take(table, selectie), items_of=len)
+    return {"scale": scale, "counts": counts, "zip_bytes": len(zip_bytes), "stages": stages}
+
+
+def compare(results, baseline, threshold):
+    """
+    Vergelijkt met een eerdere run (zelfde schalen en stappen, op `min_s`).
+    Returns: lijst van (schaal, stap, oud, nieuw, factor), alleen stappen die meer dan `threshold` trager zijn
+    """
+    old = {(run["scale"], name): stage["min_s"] for run in baseline["results"] for name, stage in run["stages"].items()}
+    regressions = []
+    for run in results:
+        for name, stage in run["stages"].items():
+            before = old.get((run["scale"], name))
+            if before:
+                factor = stage["min_s"] / before
+                logger.info("%6gx %-30s %8.4f -> %8.4f s (%.2fx)", run["scale"], name, before, stage["min_s"], factor)
+                if factor > threshold:
+                    regressions.append((run["scale"], name, before, stage["min_s"], factor))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark van de 3CX call flow pijplijn op synthetische exports.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100], help="Schaalfactoren (standaard: 1 10 100)")
+    parser.add_argument("--repeat", type=int, default=3, help="Aantal metingen per stap (standaard: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed voor de synthetische exports")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="JSON-uitvoer (standaard: benchmark.json)")
+    parser.add_argument("--baseline", help="Eerdere JSON-uitvoer om mee te vergelijken")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Factor waarboven een stap als regressie telt (standaard: 1.2)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    results = [run_scale(scale, repeat=args.repeat, seed=args.seed) for scale in args.scales]
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info("Resultaten geschreven naar %s", args.output)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for scale, name, before, after, factor in regressions:
+            logger.warning("REGRESSIE %gx %s: %.4f -> %.4f s (%.2fx)", scale, name, before, after, factor)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
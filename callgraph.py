@@ -0,0 +1,363 @@
+"""
+Geïndexeerd in-memory model van een 3CX-export.
+
+Het model wordt één keer per upload opgebouwd in `load_data_from_zip` en bevat
+DR's, wachtrijen, belgroepen en gebruikers als getypeerde records, geïndexeerd
+op extensie en op naam. Alle lookups tijdens het tekenen van flows en het
+bepalen van bereikbaarheid zijn daardoor dict-lookups (O(1)) in plaats van
+filters over complete DataFrames.
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import instrument
+from nummers import assign_nummerblokken
+
+
+# Kolommen in Receptionists.csv die naar een bestemming verwijzen
+DR_DESTINATION_COLUMNS = ["When office is closed route to", "When on break route to",
+                          "When on holiday route to", "When on holiday route to ",
+                          "Send call to", "Invalid input destination"] + [f"Menu {i}" for i in range(10)]
+
+# Onderdelen die niet als eigen Onderdeel tellen (naast lege namen), zie `split_receptionists_by_onderdeel`
+ONGELDIGE_ONDERDELEN = ('LEEG', '?')
+
+# Kolommen van de lange ledentabel van wachtrijen en belgroepen
+MEMBERSHIP_COLUMNS = ["group_ext", "group_type", "position", "member_name", "user_number"]
+
+# Typewoorden in "Type(ID ...)" bestemmingen; eerste match (substring) wint
+DESTINATION_TYPE_WORDS = (
+    ("wachtrij", "Queue"), ("queue", "Queue"),
+    ("belgroep", "RingGroup"), ("ringgroup", "RingGroup"),
+    ("gebruiker", "User"), ("user", "User"), ("extension", "User"),
+    ("digital", "DR"), ("receptionist", "DR"), ("ivr", "DR"),
+    ("voicemail", "Voicemail"),
+)
+_TYPE_ID_PATTERN = re.compile(r"(\w+)\s?\(\s?(\d+).*")
+_ID_NAME_PATTERN = re.compile(r"^(\d{3,})\s+(.*)")
+_COMMANDS = {"end call": ("EndCall", "End Call"), "repeat prompt": ("Repeat", "Repeat Prompt"),
+             "accept anyway": ("Accept", "Accept Anyway")}
+
+
+def parse_destination(dest_string):
+    """
+    Parseert een bestemming string uit de CSV's naar type en identifier.
+    Herkent nu ook formaten zoals "8020 QueueName".
+    Resultaten worden gememoiseerd (zie `destination_parser_stats`).
+    Returns: tuple: (type_hint, identifier) or (None, None)
+    """
+    if pd.isna(dest_string) or dest_string == "":
+        return None, None
+    return _parse_destination_cached(str(dest_string).strip())
+
+
+@lru_cache(maxsize=8192)
+def _parse_destination_cached(dest_string):
+    # 1. Check voor Type(Identifier ...) format (bv. Wachtrij(8020 ...))
+    match_type_id = _TYPE_ID_PATTERN.match(dest_string)
+    if match_type_id:
+        type_str = match_type_id.group(1).lower()
+        identifier = match_type_id.group(2)
+        for word, dest_type in DESTINATION_TYPE_WORDS:
+            if word in type_str:
+                return dest_type, identifier
+        # Type onbekend, maar wel ID gevonden in dit format
+        return "UnknownType", identifier
+
+    # 2. Check voor Identifier Name format (bv. "8020 QueueName")
+    #    We weten het type niet zeker, get_node_label_and_style zoekt het uit
+    match_id_name = _ID_NAME_PATTERN.match(dest_string)
+    if match_id_name:
+        return "ExtensionNumber", match_id_name.group(1)
+
+    # 3. Check voor simpele tekstuele commando's
+    command = _COMMANDS.get(dest_string.lower())
+    if command:
+        return command
+
+    # 4. Check voor extern nummer (spaties na de + toegestaan)
+    if dest_string.startswith("+") and dest_string[1:].replace(' ', '').isdigit():
+        return "External", dest_string
+
+    # 5. Check voor simpel extensie nummer (zonder naam erachter)
+    if dest_string.isdigit():
+        return "ExtensionNumber", dest_string
+
+    # Fallback voor onbekende tekst
+    return "UnknownText", dest_string
+
+
+def destination_parser_stats():
+    """Hit/miss tellers van de gememoiseerde bestemming-parser."""
+    info = _parse_destination_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+@dataclass
+class UserRecord:
+    number: str
+    naam: str
+    row: dict  # Volledige rij uit Users.csv
+    nummerblokken_did: str = ""    # Gesorteerde, komma-gescheiden blokken van alle DID's
+    nummerblok_outbound: str = ""  # Blok van het OutboundCallerID
+
+    def get(self, key, default=None):
+        return self.row.get(key, default)
+
+
+@dataclass
+class GroupRecord:
+    """Wachtrij of belgroep; `group_type` is 'Queue' of 'RingGroup'."""
+    ext: str
+    name: str
+    group_type: str
+    ring_time: object  # int (seconden) of None
+    max_wait: object   # int (seconden) of None, alleen voor wachtrijen
+    no_answer_dest: object
+    members: list      # Namen uit 'User 1', 'User 2', ... in kolomvolgorde (uit de ledentabel)
+    row: dict
+    no_answer_parsed: tuple = (None, None)  # (type, id) van no_answer_dest
+
+
+@dataclass
+class DRRecord:
+    ext: str
+    name: str
+    onderdeel: object
+    primair_secundair: object
+    row: dict  # Volledige rij uit Receptionists.csv
+    # Kolom -> (type, id) voor elke ingevulde bestemmingskolom, in DR_DESTINATION_COLUMNS volgorde
+    parsed_destinations: dict = field(default_factory=dict)
+
+    def get(self, key, default=None):
+        return self.row.get(key, default)
+
+
+@dataclass
+class CallGraphModel:
+    users_by_number: dict = field(default_factory=dict)
+    users_by_name: dict = field(default_factory=dict)
+    queues_by_ext: dict = field(default_factory=dict)
+    queues_by_name: dict = field(default_factory=dict)
+    ringgroups_by_ext: dict = field(default_factory=dict)
+    ringgroups_by_name: dict = field(default_factory=dict)
+    drs_by_ext: dict = field(default_factory=dict)
+    drs_by_name: dict = field(default_factory=dict)
+    drs: list = field(default_factory=list)  # Alle DR-records in rijvolgorde, ook een tweede rij met dezelfde extensie
+    # Lange ledentabel (zie build_membership_table) en de lookups die eruit volgen
+    memberships: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=MEMBERSHIP_COLUMNS))
+    members_by_group: dict = field(default_factory=dict)  # (group_type, ext) -> [(naam, UserRecord of None)]
+    groups_by_user: dict = field(default_factory=dict)    # user number -> [(group_type, ext)]
+
+    # Elke lookup telt als 'lookups.model' in de actieve trace (zie instrument)
+    def user(self, number):
+        instrument.count("lookups.model")
+        return self.users_by_number.get(str(number))
+
+    def user_by_name(self, naam):
+        instrument.count("lookups.model")
+        return self.users_by_name.get(str(naam))
+
+    def queue(self, ext):
+        instrument.count("lookups.model")
+        return self.queues_by_ext.get(str(ext))
+
+    def ringgroup(self, ext):
+        instrument.count("lookups.model")
+        return self.ringgroups_by_ext.get(str(ext))
+
+    def dr(self, ext):
+        instrument.count("lookups.model")
+        return self.drs_by_ext.get(str(ext))
+
+    def drs_per_onderdeel(self):
+        """Geldig Onderdeel -> DR-records (alle rijen, in rijvolgorde), gesorteerd op Onderdeel."""
+        groups = {}
+        for record in self.drs:
+            if pd.isna(record.onderdeel):
+                continue
+            onderdeel = str(record.onderdeel)
+            if onderdeel not in ONGELDIGE_ONDERDELEN and onderdeel.strip():
+                groups.setdefault(onderdeel, []).append(record)
+        return dict(sorted(groups.items()))
+
+    def group_members(self, group):
+        """Geeft (naam, UserRecord of None) per lid van een wachtrij/belgroep."""
+        return self.members_by_group.get((group.group_type, group.ext), [])
+
+    def groups_of_user(self, number):
+        """Wachtrijen/belgroepen waar de gebruiker lid van is, als (group_type, ext)."""
+        return self.groups_by_user.get(str(number), [])
+
+
+def _seconds_or_none(value):
+    num = pd.to_numeric(value, errors='coerce')
+    return int(num) if pd.notna(num) else None
+
+
+def _column_values(values):
+    """
+    Waarden van een kolom als lijst; bij een categorische kolom (compacte ingest) wijzen
+    alle rijen naar dezelfde string per categorie i.p.v. elk een eigen kopie.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories.tolist() + [np.nan]  # Code -1 (leeg) wijst naar de laatste
+        return [categories[code] for code in values.cat.codes.tolist()]
+    return values.tolist()
+
+
+def _records(df):
+    """Rijen als dicts, zoals df.to_dict('records'), maar kolomsgewijs via tolist() (veel sneller op string-kolommen)."""
+    if df is None or df.empty:
+        return []
+    columns = list(df.columns)
+    return [dict(zip(columns, row)) for row in zip(*(_column_values(df.iloc[:, i]) for i in range(len(columns))))]
+
+
+def build_membership_table(queues_df, ringgroups_df, users_df):
+    """
+    Zet de brede 'User 1', 'User 2', ... kolommen van wachtrijen en belgroepen om
+    naar één lange tabel (group_ext, group_type, position, member_name, user_number),
+    met de gebruikersnummers in één merge op de naam uit Users.csv opgezocht.
+    Per extensie telt alleen de eerste rij, net als in het model; leden zonder
+    bijbehorende gebruiker houden user_number NaN.
+    """
+    parts = []
+    for group_type, df in (("Queue", queues_df), ("RingGroup", ringgroups_df)):
+        if df is None or df.empty or "Virtual Extension Number" not in df.columns:
+            continue
+        user_cols = [col for col in df.columns if col.startswith("User ")]
+        if not user_cols:
+            continue
+        groups = df.assign(group_ext=df["Virtual Extension Number"].astype(str)).drop_duplicates("group_ext")
+        groups = groups.assign(_row=range(len(groups)))
+        long = groups.melt(id_vars=["group_ext", "_row"], value_vars=user_cols,
+                           var_name="column", value_name="member_name").dropna(subset=["member_name"])
+        long["position"] = long["column"].map({col: pos for pos, col in enumerate(user_cols, start=1)})
+        long["group_type"] = group_type
+        long["member_name"] = long["member_name"].astype(str)
+        parts.append(long.sort_values(["_row", "position"]))
+    if not parts:
+        return pd.DataFrame(columns=MEMBERSHIP_COLUMNS)
+    long = pd.concat(parts, ignore_index=True)
+
+    if users_df is not None and {"Naam", "Number"} <= set(users_df.columns):
+        # Eerste gebruiker met een naam wint, net als users_by_name
+        users = users_df.dropna(subset=["Naam"])
+        lookup = pd.DataFrame({"member_name": users["Naam"].astype(str), "user_number": users["Number"].astype(str)})
+        long = long.merge(lookup.drop_duplicates("member_name"), on="member_name", how="left")
+    else:
+        long["user_number"] = None
+    return long[MEMBERSHIP_COLUMNS].reset_index(drop=True)
+
+
+def _index_memberships(model):
+    """Vult members_by_group en groups_by_user uit de lange ledentabel."""
+    shared = {}  # Eén (group_type, ext) tuple per groep en één string per ledennaam, i.p.v. één per lidmaatschap
+    for group_type, ext, naam, number in model.memberships[["group_type", "group_ext", "member_name", "user_number"]].itertuples(index=False):
+        user = model.users_by_number.get(number) if pd.notna(number) else None
+        node = shared.setdefault((group_type, ext), (group_type, ext))
+        model.members_by_group.setdefault(node, []).append((shared.setdefault(naam, naam), user))
+        if user is not None:
+            model.groups_by_user.setdefault(number, []).append(node)
+
+
+def _build_groups(df, group_type, name_col, fallback_prefix, members_by_group):
+    by_ext, by_name = {}, {}
+    if df is None or df.empty or "Virtual Extension Number" not in df.columns:
+        return by_ext, by_name
+    for row in _records(df):
+        ext = str(row["Virtual Extension Number"])
+        name = row.get(name_col, f"{fallback_prefix} {ext}")
+        record = GroupRecord(
+            ext=ext,
+            name=name,
+            group_type=group_type,
+            ring_time=_seconds_or_none(row["Ring time (s)"]) if "Ring time (s)" in row else None,
+            max_wait=_seconds_or_none(row["Max queue wait time (s)"]) if "Max queue wait time (s)" in row else None,
+            no_answer_dest=row.get("Destination if no answer", None),
+            members=[naam for naam, _ in members_by_group.get((group_type, ext), [])],
+            row=row,
+            no_answer_parsed=parse_destination(row.get("Destination if no answer", None)),
+        )
+        # Eerste voorkomen wint, net als bij .iloc[0] op een gefilterde DataFrame
+        by_ext.setdefault(ext, record)
+        if pd.notna(name):
+            by_name.setdefault(str(name), record)
+    return by_ext, by_name
+
+
+def build_call_graph_model(data):
+    """Bouwt het geïndexeerde model uit de (voorbereide) DataFrames van `load_data_from_zip`."""
+    model = CallGraphModel()
+
+    users_df = data.get("users", pd.DataFrame())
+    did_blokken, outbound_blokken = assign_nummerblokken(users_df, data.get("nummerblok_index"))
+    for pos, row in enumerate(_records(users_df)):
+        number = str(row.get("Number", ""))
+        naam = row.get("Naam", "")
+        record = UserRecord(number=number, naam=naam, row=row,
+                            nummerblokken_did=did_blokken[pos], nummerblok_outbound=outbound_blokken[pos])
+        model.users_by_number.setdefault(number, record)
+        if pd.notna(naam):
+            model.users_by_name.setdefault(str(naam), record)
+
+    model.memberships = build_membership_table(data.get("queues"), data.get("ringgroups"), users_df)
+    _index_memberships(model)
+    model.queues_by_ext, model.queues_by_name = _build_groups(
+        data.get("queues"), "Queue", "Queue Name", "Queue", model.members_by_group)
+    model.ringgroups_by_ext, model.ringgroups_by_name = _build_groups(
+        data.get("ringgroups"), "RingGroup", "Ring Group Name", "Ring Group", model.members_by_group)
+
+    receptionists_df = data.get("receptionists_all", pd.DataFrame())
+    if "Virtual Extension Number" in receptionists_df.columns:
+        for row in _records(receptionists_df):
+            ext = str(row["Virtual Extension Number"])
+            name = row.get("Digital Receptionist Name", f"DR {ext}")
+            parsed = {col: parse_destination(row[col]) for col in DR_DESTINATION_COLUMNS
+                      if col in row and pd.notna(row[col])}
+            record = DRRecord(ext=ext, name=name, onderdeel=row.get("Onderdeel"),
+                              primair_secundair=row.get("Primair/Secundair"), row=row,
+                              parsed_destinations=parsed)
+            model.drs.append(record)
+            model.drs_by_ext.setdefault(ext, record)
+            if pd.notna(name):
+                model.drs_by_name.setdefault(str(name), record)
+
+    return model
+
+
+def normalize_onderdeel(receptionists_df):
+    """
+    Vult lege Onderdelen met 'LEEG' (in place), zoals alle tabs ze tonen.
+    Een categorische kolom (compacte ingest) blijft categorisch.
+    """
+    onderdeel = receptionists_df['Onderdeel']
+    if isinstance(onderdeel.dtype, pd.CategoricalDtype):
+        if onderdeel.hasnans:
+            if 'LEEG' not in onderdeel.cat.categories:
+                onderdeel = onderdeel.cat.add_categories(['LEEG'])
+            receptionists_df['Onderdeel'] = onderdeel.fillna('LEEG')
+    else:
+        # Eerst vullen: astype(str) maakt van NaN 'nan' (oudere pandas) of laat NaN staan (pandas 3)
+        receptionists_df['Onderdeel'] = onderdeel.fillna('LEEG').astype(str)
+
+
+def split_receptionists_by_onderdeel(receptionists_df):
+    """
+    Splitst de DR's in DR's met een geldig Onderdeel en DR's zonder (leeg, NaN of '?').
+    Returns: tuple (drs_met_geldig_onderdeel, drs_zonder_geldig_onderdeel, alle_geldige_onderdelen_namen)
+    """
+    # Maak kolom 'Onderdeel' string en vul NaN
+    onderdelen = receptionists_df['Onderdeel'].astype(object).fillna('LEEG').astype(str)  # object: ook voor categorisch
+    geldig = ~onderdelen.isin(ONGELDIGE_ONDERDELEN) & (onderdelen.str.strip() != '')
+    drs_met_geldig_onderdeel = receptionists_df[geldig].copy()
+    drs_met_geldig_onderdeel['Onderdeel'] = onderdelen[geldig]
+    drs_zonder_geldig_onderdeel = receptionists_df[~geldig].copy()
+    drs_zonder_geldig_onderdeel['Onderdeel'] = onderdelen[~geldig]
+    alle_geldige_onderdelen_namen = sorted(onderdelen[geldig].unique())
+    return drs_met_geldig_onderdeel, drs_zonder_geldig_onderdeel, alle_geldige_onderdelen_namen
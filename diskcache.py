@@ -0,0 +1,114 @@
+"""
+Size-bounded LRU cache op schijf, gedeeld door de SVG-rendercache en de
+snapshotcache van ingest.
+
+Bestanden worden atomisch geschreven (tijdelijk bestand + os.replace), zodat
+meerdere threads of processen dezelfde map veilig kunnen delen. Bij elke hit
+wordt de mtime bijgewerkt; bij overschrijding van `max_bytes` worden de
+bestanden met de oudste mtime verwijderd.
+
+De totale grootte wordt per instantie bijgehouden, zodat `put` de map niet bij
+elke schrijfactie hoeft te scannen. Alleen als het lopende totaal `max_bytes`
+overschrijdt, of na `RESCAN_EVERY` schrijfacties (andere processen schrijven
+ook in de map), volgt een volledige scan.
+"""
+import os
+import tempfile
+
+RESCAN_EVERY = 100  # Schrijfacties tussen twee volledige scans, ook als de limiet niet is bereikt
+EVICT_TO = 0.9  # Bij overschrijding terug naar deze fractie van max_bytes, zodat niet elke volgende put scant
+
+
+class DiskCache:
+    """Size-bounded LRU cache op schijf: één bestand per (hex-)sleutel, verdeeld over submappen."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # Lopend totaal in bytes; None = nog niet gescand
+        self._writes = 0  # Schrijfacties sinds de laatste scan
+
+    def _path(self, key, fmt):
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def get(self, key, fmt):
+        path = self._path(key, fmt)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # LRU: markeer als recent gebruikt
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key, data, fmt):
+        path = self._path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomisch schrijven, zodat parallelle renders/processen nooit een half bestand lezen
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            try:
+                old_size = os.path.getsize(path)  # Overschrijven telt niet dubbel
+            except OSError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)  # Geen half .tmp-bestand achterlaten (schijf vol, alleen-lezen)
+            except OSError:
+                pass
+            raise
+        self._writes += 1
+        if self._size is None or self._writes >= RESCAN_EVERY:
+            self.evict()
+            return
+        self._size += len(data) - old_size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """Lijst van (mtime, grootte, pad) van alle cachebestanden."""
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Tegelijk door een ander proces verwijderd
+                result.append((stat.st_mtime, stat.st_size, entry.path))
+        return result
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Scant de map; boven `max_bytes` gaan de oudste bestanden weg tot EVICT_TO daarvan."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            target = self.max_bytes * EVICT_TO
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= target:
+                    break
+        self._size = total
+        self._writes = 0
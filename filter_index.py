@@ -0,0 +1,56 @@
+"""
+Filters voor de tabellen van tab 2 en 3 zonder DataFrame-kopieën.
+
+`FilterIndex` wordt één keer per tabel opgebouwd (samen met de tabel gecachet)
+en houdt per filterkolom bij op welke rijposities elke waarde staat. Een
+filterklik is dan een vereniging van de rijen van de gekozen waarden per kolom
+en een doorsnede over de kolommen; alleen het resultaat wordt met één `iloc`
+uit de tabel gehaald. Onafhankelijk van Streamlit.
+"""
+import numpy as np
+import pandas as pd
+
+
+class FilterIndex:
+    """Per kolom: waarde -> gesorteerde rijposities (numpy), voor een vaste tabel."""
+
+    def __init__(self, df, columns):
+        self.n_rows = len(df)
+        self.rows = {}  # kolom -> {waarde: rijposities}, waarden gesorteerd
+        self.complete = set()  # Kolommen zonder lege (NaN) cellen: daar is 'alles gekozen' geen filter
+        for col in columns:
+            if col not in df.columns:
+                continue
+            # Als str, zoals de keuzelijsten ze tonen; stabiel sorteren houdt de rijposities per waarde oplopend
+            codes, uniques = pd.factorize(df[col].astype(str).to_numpy(dtype=object), sort=True)
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self.rows[col] = {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+            if bounds[0] == 0:
+                self.complete.add(col)
+
+    def options(self, col, exclude=()):
+        """Gesorteerde waarden van `col` voor een keuzelijst (zonder `exclude`)."""
+        return [value for value in self.rows.get(col, {}) if value not in exclude]
+
+    def select(self, selections):
+        """
+        selections: dict kolom -> gekozen waarden; een lege keuze filtert niet.
+        Returns: oplopende rijposities die in elke kolom een gekozen waarde hebben
+        """
+        result = None
+        for col, values in selections.items():
+            per_value = self.rows.get(col)
+            if not values or per_value is None:
+                continue
+            if col in self.complete and len(values) == len(per_value):  # Alles gekozen: geen beperking
+                continue
+            chosen = [per_value[value] for value in values if value in per_value]
+            rows = np.sort(np.concatenate(chosen)) if chosen else np.empty(0, dtype=np.intp)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        return np.arange(self.n_rows) if result is None else result
+
+    def take(self, df, selections):
+        """De rijen van `df` (dezelfde tabel als bij het opbouwen) die aan `selections` voldoen."""
+        rows = self.select(selections)
+        return df if len(rows) == self.n_rows else df.iloc[rows]
@@ -0,0 +1,666 @@
+"""
+Opbouw van call flow grafieken (Graphviz) en de bijbehorende gebruikers-CSV's.
+
+Deze module is onafhankelijk van Streamlit, zodat zowel de app (`telephony.py`)
+als de batch-export (`batch_export.py`) dezelfde flow-logica gebruiken.
+"""
+import re
+import warnings
+from dataclasses import dataclass, field
+
+import graphviz
+import numpy as np
+import pandas as pd
+
+import instrument
+from callgraph import parse_destination
+from graph_viewer import graph_json
+
+# --- Onderdruk specifieke Graphviz warning --- 
+try:
+    # Probeer de specifieke warning klasse te importeren als die bestaat
+    from graphviz.quoting import DotSyntaxWarning
+    warnings.filterwarnings("ignore", category=DotSyntaxWarning)
+except ImportError:
+    # Fallback als de specifieke klasse niet bestaat (oudere version?) 
+    # Probeer te filteren op basis van message - minder robuust
+    warnings.filterwarnings("ignore", message=".*expect syntax error scanning invalid quoted string.*", category=UserWarning) # of DeprecationWarning? Kan varieren.
+# --- Einde onderdrukking ---
+
+HIGHLIGHT_FILLCOLOR = 'gold'  # Vulkleur van gewijzigde knopen in de vergelijkmodus
+
+# Standaard detailniveau van de app: klein genoeg om elke flow ruim binnen een seconde te layouten
+DETAIL_MAX_MEMBERS = 15
+DETAIL_MAX_DEPTH = 3
+DETAIL_MAX_NODES = 150
+
+# Veiligheidsgrens voor de recursie: elke sub-flow wordt één keer uitgewerkt, dus de diepte
+# is hooguit het aantal geneste DR's/wachtrijen/belgroepen op één pad
+MAX_FLOW_DEPTH = 50
+
+
+@dataclass
+class DetailLevel:
+    """
+    Level-of-detail van een flow, mee te geven als `all_data["detail"]` (zonder: alles uitgeschreven).
+    Ingeklapte knopen komen tijdens het bouwen in `folded`, zodat de UI ze kan laten uitklappen.
+    Knopen zijn (soort, extensie), zoals in `highlight_nodes`.
+    """
+    max_members: object = None  # int of None: bij meer leden toont een wachtrij/belgroep alleen aantallen
+    max_depth: object = None    # int of None: DR's dieper in de flow worden een samenvattingsknoop
+    max_nodes: object = None    # int of None: na zoveel knopen worden verdere DR's ook ingeklapt
+    expanded: frozenset = frozenset()  # Knopen die de gebruiker heeft uitgeklapt
+    folded: set = field(default_factory=set)  # Ingeklapte knopen, gevuld tijdens het bouwen
+
+    def fold_members(self, node, n_members):
+        if node in self.expanded or self.max_members is None or n_members <= self.max_members:
+            return False
+        self.folded.add(node)
+        return True
+
+    def cache_key(self):
+        """Hashbare sleutel van de instellingen en de uitgeklapte knopen (zonder de uitkomst `folded`)."""
+        return (self.max_members, self.max_depth, self.max_nodes, tuple(sorted(self.expanded)))
+
+    def fold_dr(self, node, depth, n_nodes):
+        if node in self.expanded or not ((self.max_depth is not None and depth > self.max_depth)
+                                         or (self.max_nodes is not None and n_nodes >= self.max_nodes)):
+            return False
+        self.folded.add(node)
+        return True
+
+
+@dataclass
+class Flow:
+    """
+    Tussenvorm van één flow: knopen, pijlen en gebruikersrijen, zonder graphviz.
+    Eén keer opgebouwd; DOT/SVG (`flow_to_dot`), JSON (`graph_viewer.graph_json`) en
+    de CSV (`users_flow_csv(flow.users)`) worden er allemaal uit afgeleid. Bevat
+    alleen strings, tuples, lijsten en dicts, dus te picklen en te cachen.
+    """
+    name: str
+    comment: str
+    # ('node', id, label, knooptype, attrs) en ('edge', bron, doel, label, attrs) in volgorde van tekenen
+    items: list = field(default_factory=list)
+    users: list = field(default_factory=list)  # Gebruikersrijen voor de CSV-export
+
+    def node(self, name, label=None, node_type=None, **attrs):
+        self.items.append(("node", name, label, node_type, attrs))
+
+    def edge(self, tail_name, head_name, label=None, **attrs):
+        self.items.append(("edge", tail_name, head_name, label, attrs))
+
+    @property
+    def n_nodes(self):
+        return sum(item[0] == "node" for item in self.items)
+
+    def to_dict(self):
+        """Knopen en pijlen als dicts (zie `graph_viewer`); het knooptype komt uit `get_node_label_and_style`."""
+        nodes, edges = [], []
+        for kind, a, b, c, attrs in self.items:
+            if kind == "node":
+                node = {"id": a, "label": b, "type": c, "shape": attrs.get("shape"), "color": attrs.get("fillcolor")}
+                if "dashed" in attrs.get("style", ""):
+                    node["folded"] = True  # Ingeklapte sub-flow (level-of-detail)
+                nodes.append(node)
+            else:
+                edge = {"source": a, "target": b}
+                if c: edge["label"] = c
+                if attrs.get("style") == "dashed": edge["cycle"] = True
+                edges.append(edge)
+        return {"name": self.name, "nodes": nodes, "edges": edges}
+
+
+def flow_to_dot(flow):
+    """DOT-back end: returns graphviz.Digraph van een Flow (zelfde opmaak voor alle flows)."""
+    dot = graphviz.Digraph(name=flow.name, comment=flow.comment)
+    dot.attr(rankdir='LR', size='25,25!', ranksep='0.8', nodesep='0.6', overlap='prism', splines='spline')
+    dot.attr('node', shape='box', style='rounded,filled', fontname='Arial', fontsize='9')
+    dot.attr('edge', fontname='Arial', fontsize='8')
+    for kind, a, b, c, attrs in flow.items:
+        if kind == "node":
+            dot.node(a, b, **attrs)
+        else:
+            dot.edge(a, b, label=c, **attrs)
+    return dot
+
+
+@dataclass(frozen=True)
+class FlowOutput:
+    """
+    Een gebouwde Flow met alles wat de app ervan toont (DOT-bron, JSON, gebruikers-CSV)
+    en de knopen die bij het bouwen zijn ingeklapt; zo te cachen tussen reruns en sessies.
+    """
+    flow: Flow
+    folded: frozenset
+    dot_source: str
+    json: str
+    csv: bytes      # Leeg als er geen gebruikers in de flow zitten
+    n_csv_rows: int
+
+    @classmethod
+    def of(cls, flow, folded=frozenset()):
+        csv, n_csv_rows = users_flow_csv(flow.users) if flow.users else (b"", 0)
+        return cls(flow, frozenset(folded), flow_to_dot(flow).source, graph_json(flow), csv, n_csv_rows)
+
+
+class _FoldedGraph:
+    """Vangt de knopen en pijlen van een ingeklapte sub-flow op; de gebruikers-CSV blijft compleet."""
+    def node(self, *args, **kwargs): pass
+    def edge(self, *args, **kwargs): pass
+
+
+def get_user_details_for_csv(user_identifier, identifier_type, all_data, flow_context,
+                             reached_via_type=None, reached_via_name=None, reached_via_ext=None):
+    """
+    Haalt gebruikersdetails (volledige rij uit Users.csv) op voor CSV-export,
+    aangevuld met flow-context en nummerblokinformatie.
+    """
+    model = all_data["model"]
+
+    user_record = None
+    if identifier_type == "Number":
+        user_record = model.user(user_identifier)
+    elif identifier_type == "Naam":
+        user_record = model.user_by_name(user_identifier)
+
+    if user_record is not None:
+        user_info_series = user_record.row
+        # Start met alle kolommen van de user als een dictionary
+        user_details_dict = dict(user_info_series)
+
+        # Voeg flow context en Reached Via info toe
+        user_details_dict["FlowContext"] = flow_context
+        user_details_dict["Reached Via Type"] = str(reached_via_type) if reached_via_type else ""
+        user_details_dict["Reached Via Name"] = str(reached_via_name) if reached_via_name else ""
+        user_details_dict["Reached Via Ext"] = str(reached_via_ext) if reached_via_ext else ""
+
+        # Voeg nummerblok informatie toe (al bij het laden toegewezen)
+        user_details_dict["Nummerblok(ken) DID"] = user_record.nummerblokken_did
+        user_details_dict["Nummerblok OutboundCID"] = user_record.nummerblok_outbound
+        
+        # Converteer alle waarden naar string om problemen met mixed types in CSV te voorkomen
+        for key, value in user_details_dict.items():
+            user_details_dict[key] = str(value)
+            
+        return user_details_dict
+    return None
+
+def format_user_details(user_info):
+    # (Ongewijzigd)
+    details = [f"Ext: {str(user_info.get('Number', 'N/A')).replace('.0', '')}"]
+    mob = user_info.get('MobileNumber', '');
+    if pd.notna(mob) and str(mob).strip(): details.append(f"Mob: {str(mob).strip()}")
+    cid = user_info.get('OutboundCallerID', '');
+    if pd.notna(cid) and str(cid).strip(): details.append(f"CID: {str(cid).strip()}")
+    did_str = user_info.get('DID', '');
+    if pd.notna(did_str) and str(did_str).strip():
+        first_did = str(did_str).split(':')[0].strip()
+        if first_did: details.append(f"DID: {first_did}")
+    return ", ".join(details)
+
+def format_members(group, model, detail=None):
+    """Formatteert de leden van een wachtrij/belgroep voor in een node label (ingeklapt: alleen aantallen)."""
+    leden = model.group_members(group)
+    if detail is not None and detail.fold_members((group.group_type, group.ext), len(leden)):
+        onbekend = sum(user is None for _, user in leden)
+        return f"{len(leden)} leden" + (f", waarvan {onbekend} ❓" if onbekend else "") + " (ingeklapt)"
+    members = [f"{naam} ({format_user_details(user.row)})" if user is not None else f"{naam} (❓)"
+               for naam, user in leden]
+    return "\n ".join(members) if members else "(Geen leden)"
+
+def resolve_node(identifier, type_hint, model):
+    """
+    Het record achter een numerieke bestemming, met dezelfde voorrang als de labels:
+    wachtrij, belgroep, gebruiker, dan DR. Bouwt geen label.
+    Returns: tuple (knooptype, record) of ("Unknown", None)
+    """
+    ext_nr = str(identifier)
+    guess = type_hint in ("ExtensionNumber", "UnknownType")
+    if guess or type_hint == "Queue":
+        queue = model.queue(ext_nr)
+        if queue is not None: return "Queue", queue
+    if guess or type_hint == "RingGroup":
+        rg = model.ringgroup(ext_nr)
+        if rg is not None: return "RingGroup", rg
+    if guess or type_hint == "User":
+        user = model.user(ext_nr)
+        if user is not None: return "User", user
+    if guess or type_hint == "DR":
+        dr = model.dr(ext_nr)
+        if dr is not None: return "DR", dr
+    return "Unknown", None
+
+
+def get_node_label_and_style(identifier, type_hint, all_data, resolved=None):
+    """
+    Genereert label en bepaalt stijl, nu inclusief Q/RG tijden (robuuster).
+    resolved: al bepaalde `resolve_node(identifier, type_hint, model)`, zodat de lookups niet dubbel gebeuren
+    """
+    model = all_data["model"]
+
+    label = f"❓ Onbekend ID: {identifier}"; shape = 'box'; fillcolor = 'lightgrey'; node_type = "Unknown"
+
+    if pd.isna(identifier) or identifier == "": label = "Niet geconfigureerd"; node_type="ConfigError"
+    elif type_hint == "EndCall": label = "❌ Ophangen"; shape='octagon'; fillcolor='red'; node_type="End"
+    elif type_hint == "Repeat": label = "🔁 Herhaal Prompt"; shape='invhouse'; fillcolor='orange'; node_type="Action"
+    elif type_hint == "External": label = f"📞 Extern:\n{identifier}"; shape='note'; fillcolor='khaki'; node_type="External"
+    elif type_hint == "Accept": label = "➡️ Accepteer"; shape='rarrow'; fillcolor='lightgreen'; node_type="Action"
+    elif type_hint == "UnknownText": label = f"❓ Tekst:\n{identifier}"; node_type="Unknown"
+    elif str(identifier).isdigit():
+        ext_nr = str(identifier); label = f"❓ Ext: {ext_nr}"
+        node_type, record = resolved or resolve_node(ext_nr, type_hint, model)
+
+        if node_type == "Queue":
+            ring_time_str = f"{record.ring_time}s" if record.ring_time is not None else "N/A"
+            max_wait_str = f"{record.max_wait}s" if record.max_wait is not None else "N/A"
+            time_label = f"(Ring: {ring_time_str}, MaxWait: {max_wait_str})"
+            members_str = format_members(record, model, all_data.get("detail"))
+            label = f"👥 Queue: {record.name} ({ext_nr})\n{time_label}\nLeden:\n {members_str}"; shape='box'; fillcolor='palegreen'
+        elif node_type == "RingGroup":
+            ring_time_str = f"{record.ring_time}s" if record.ring_time is not None else "N/A"
+            time_label = f"(Ring: {ring_time_str})"
+            members_str = format_members(record, model, all_data.get("detail"))
+            label = f"🔔 RG: {record.name} ({ext_nr})\n{time_label}\nLeden:\n {members_str}"; shape='box'; fillcolor='lightskyblue'
+        elif node_type == "User":
+            user_name = record.get('Naam', f"User {ext_nr}")
+            label = f"👤 Gebruiker: {user_name}\n({format_user_details(record.row)})"; shape='ellipse'; fillcolor='whitesmoke'
+        elif node_type == "DR":
+            label = f"🚦 IVR: {record.name}\n({ext_nr})"; shape='Mdiamond'; fillcolor='lightcoral'
+        elif type_hint == "Voicemail":
+            user_vm = model.user(ext_nr)
+            vm_owner = user_vm.get('Naam', '') if user_vm is not None else ''
+            label = f"🎙️ Voicemail ({ext_nr})\n{'van: '+vm_owner if vm_owner else ''}"; shape='cylinder'; fillcolor='mediumpurple'; node_type="Voicemail"
+
+    # Vergelijkmodus (snapshot_diff): nieuwe en gewijzigde DR's, wachtrijen, belgroepen en gebruikers vallen op
+    if (node_type, str(identifier)) in all_data.get("highlight_nodes", ()): fillcolor = HIGHLIGHT_FILLCOLOR
+
+    return label, shape, fillcolor, node_type
+
+def make_node_id_refactored(prefix, identifier, context):
+    """Genereert een unieke node ID met context (onderdeel of DR ext)."""
+    # Converteer alles expliciet naar string en vervang eerst backslashes
+    s_identifier = str(identifier).replace("\\", "_")
+    s_context = str(context).replace("\\", "_")
+    s_prefix = str(prefix).replace("\\", "_")
+
+    # Verwijder alle karakters die geen letter, cijfer of underscore zijn
+    safe_identifier = re.sub(r'[^a-zA-Z0-9_]', '_', s_identifier)
+    safe_context = re.sub(r'[^a-zA-Z0-9_]', '_', s_context)
+    safe_prefix = re.sub(r'[^a-zA-Z0-9_]', '_', s_prefix)
+
+    # Zorg dat het niet start/eindigt met underscore en geen dubbele underscores
+    temp_id = f"{safe_prefix}_{safe_context}_{safe_identifier[:30]}"
+    temp_id = re.sub(r'_+', '_', temp_id) # Vervang multiple underscores met enkele
+    temp_id = temp_id.strip('_') # Verwijder leading/trailing underscores
+
+    # Fallback als ID leeg wordt na opschonen
+    if not temp_id:
+        return f"empty_node_{np.random.randint(100000)}"
+    return temp_id
+
+def create_or_get_node_refactored(dot_graph, node_id, label, added_nodes_set, shape='box', fillcolor='lightblue', node_type=None, **attrs):
+     """Voegt een node toe aan de grafiek als deze nog niet bestaat (`node_type` alleen voor de JSON-export)."""
+     if node_id not in added_nodes_set:
+         dot_graph.node(node_id, label, shape=shape, fillcolor=fillcolor, node_type=node_type, **attrs)
+         added_nodes_set.add(node_id)
+     return node_id
+
+@dataclass
+class _Expansions:
+    """
+    Sub-flows (DR's, wachtrijen, belgroepen) die binnen één start-DR al uitgewerkt zijn:
+    (knooptype, extensie) -> knoop-id. Een latere verwijzing krijgt alleen een pijl naar die
+    knoop, zodat elke sub-flow één keer gevolgd wordt en de opbouw lineair blijft in de
+    grootte van de PBX. `active` zijn de sub-flows op het huidige pad: een pijl daarheen is
+    een cyclus. Ingeklapte sub-flows worden onzichtbaar gevolgd met eigen toestand (`hidden`).
+    """
+    nodes: dict = field(default_factory=dict)
+    active: set = field(default_factory=set)
+    hidden: object = None  # (graaf, all_data, knopen, pijlen, _Expansions) voor ingeklapte sub-flows
+
+    def hidden_walk(self, all_data):
+        if self.hidden is None:
+            self.hidden = (_FoldedGraph(), dict(all_data, detail=None), set(), set(), _Expansions())
+        return self.hidden
+
+
+def _link_or_expand(dot_graph, source_node_id, edge_label, key, target_node_id, current_added_nodes, current_added_edges, expansions):
+    """
+    Pijl naar een al uitgewerkte sub-flow (grijs gestreept als het een cyclus is).
+    Returns: True als `key` al uitgewerkt is, anders wordt `target_node_id` voor `key` vastgelegd en False
+    """
+    existing = expansions.nodes.get(key)
+    if existing is None:
+        expansions.nodes[key] = target_node_id
+        return False
+    instrument.count("flows.gedeeld")
+    if existing not in current_added_nodes:
+        return True
+    if key in expansions.active:
+        edge_key = (source_node_id, existing, edge_label + " (cycle)")
+        if edge_key not in current_added_edges:
+            dot_graph.edge(source_node_id, existing, label=edge_label + " (cycle)", style='dashed', color='grey')
+            current_added_edges.add(edge_key)
+    else:
+        edge_key = (source_node_id, existing, edge_label)
+        if edge_key not in current_added_edges:
+            dot_graph.edge(source_node_id, existing, label=edge_label)
+            current_added_edges.add(edge_key)
+    return True
+
+
+# Aangepaste signatuur en logica voor gebruikers-CSV
+def draw_destination_refactored(dot_graph, source_node_id, edge_label, dest_string, current_all_data, context,
+                                flow_context_for_csv, users_in_flow_set, users_in_flow_data_list,
+                                current_added_nodes, current_added_edges, expansions,
+                                depth=0, max_depth=MAX_FLOW_DEPTH):
+    """
+    Tekent een pijl naar een bestemming en volgt recursief, en verzamelt GEBRUIKERSdata voor CSV export.
+    DR's, wachtrijen en belgroepen worden per `expansions` één keer uitgewerkt (knoop-id zonder
+    pijllabel of diepte); eindpunten (gebruikers, voicemail, ophangen, ...) krijgen per pijl een eigen knoop.
+    """
+    instrument.count("flows.recursie")
+
+    if depth > max_depth:
+        max_depth_node_id = make_node_id_refactored("MAXDEPTH", edge_label, source_node_id)
+        create_or_get_node_refactored(dot_graph, max_depth_node_id, "Max Recursion Depth Reached", current_added_nodes, shape='octagon', fillcolor='orange', node_type="MaxDepth")
+        edge_key = (source_node_id, max_depth_node_id, edge_label + " (max depth)")
+        if edge_key not in current_added_edges:
+            dot_graph.edge(source_node_id, max_depth_node_id, label=edge_label + " (max depth)")
+            current_added_edges.add(edge_key)
+        return
+
+    dest_type, dest_id = parse_destination(dest_string)
+
+    safe_edge_label_for_id = edge_label.replace(' ','_').replace('/','_').replace('\n','_')\
+                                      .replace('(','').replace(')','').replace(':','')\
+                                      .replace("\\", "_")
+
+    if not dest_type:
+        target_node_id = make_node_id_refactored("END", safe_edge_label_for_id, source_node_id)
+        target_label, target_shape, target_color, _ = get_node_label_and_style(None, "EndCall", current_all_data)
+        create_or_get_node_refactored(dot_graph, target_node_id, target_label, current_added_nodes, shape=target_shape, fillcolor=target_color, node_type="End")
+        edge_key = (source_node_id, target_node_id, edge_label)
+        if edge_key not in current_added_edges:
+            dot_graph.edge(source_node_id, target_node_id, label=edge_label)
+            current_added_edges.add(edge_key)
+        return
+
+    model = current_all_data["model"]
+    # Eerst alleen het type: een al uitgewerkte DR/wachtrij/belgroep krijgt een pijl, zonder label (ledenlijst) te bouwen
+    resolved = resolve_node(dest_id, dest_type, model) if str(dest_id).isdigit() else None
+    if resolved is not None and resolved[0] in ("DR", "Queue", "RingGroup"):
+        key = (resolved[0], str(dest_id))
+        target_node_id = make_node_id_refactored(f"DEST_{resolved[0]}", dest_id, context)
+        if _link_or_expand(dot_graph, source_node_id, edge_label, key, target_node_id,
+                           current_added_nodes, current_added_edges, expansions):
+            return
+    else:
+        target_node_id = make_node_id_refactored(f"DEST_{dest_type}", f"{dest_id}_{safe_edge_label_for_id}", source_node_id)
+    target_label, target_shape, target_color, target_node_type = get_node_label_and_style(dest_id, dest_type, current_all_data, resolved)
+    key = (target_node_type, str(dest_id))
+
+    # Level-of-detail: een te diepe DR (of een DR na het knopenbudget) wordt een samenvattingsknoop;
+    # de sub-flow wordt wel gevolgd, maar in een graaf die niets tekent
+    detail = current_all_data.get("detail")
+    folded = target_node_type == "DR" and detail is not None and detail.fold_dr(("DR", str(dest_id)), depth, len(current_added_nodes))
+    if folded:
+        n_users = len(current_all_data["reachability"].reachable_users(("DR", str(dest_id))))
+        target_label += f"\n⊕ Sub-flow ingeklapt ({n_users} gebruikers bereikbaar)"
+        create_or_get_node_refactored(dot_graph, target_node_id, target_label, current_added_nodes, shape=target_shape, fillcolor=target_color,
+                                      style='rounded,filled,dashed', node_type=target_node_type)
+    else:
+        create_or_get_node_refactored(dot_graph, target_node_id, target_label, current_added_nodes, shape=target_shape, fillcolor=target_color, node_type=target_node_type)
+    edge_key = (source_node_id, target_node_id, edge_label)
+    if edge_key not in current_added_edges:
+        dot_graph.edge(source_node_id, target_node_id, label=edge_label)
+        current_added_edges.add(edge_key)
+
+    # --- VERZAMEL GEBRUIKERSDATA --- 
+    if target_node_type == "User":
+        # Gebruik dest_id (extensienummer) en flow_context voor de key in de set
+        user_key_tuple = (str(dest_id), flow_context_for_csv)
+        if user_key_tuple not in users_in_flow_set:
+            user_details = get_user_details_for_csv(dest_id, "Number", current_all_data, flow_context_for_csv)
+            if user_details:
+                users_in_flow_data_list.append(user_details)
+                users_in_flow_set.add(user_key_tuple)
+
+    elif target_node_type in ("Queue", "RingGroup") and dest_id:
+        group = model.queue(dest_id) if target_node_type == "Queue" else model.ringgroup(dest_id)
+        if group is not None:
+            for member_name, member in model.group_members(group):
+                if member is not None and member.number:
+                    # Key voor de set: user number en flow context
+                    user_key_tuple = (member.number, flow_context_for_csv)
+                    if user_key_tuple not in users_in_flow_set:
+                        user_details = get_user_details_for_csv(member_name, "Naam", current_all_data, flow_context_for_csv,
+                                                              reached_via_type=target_node_type, reached_via_name=group.name, reached_via_ext=str(dest_id))
+                        if user_details:
+                            users_in_flow_data_list.append(user_details)
+                            users_in_flow_set.add(user_key_tuple)
+    # --- EINDE VERZAMEL GEBRUIKERSDATA ---
+
+    # --- Recursief volgen: de bestemmingen van een wachtrij/belgroep (No Answer) of DR ---
+    if target_node_type in ("Queue", "RingGroup") and dest_id:
+        group = model.queue(dest_id) if target_node_type == "Queue" else model.ringgroup(dest_id)
+        dest_cols_recursive = [("No Answer", group.no_answer_dest)] if group is not None else []
+    elif target_node_type == "DR" and dest_id:
+        if folded:  # Eigen knopen, pijlen en expansies: niets van de ingeklapte sub-flow mag zichtbare knopen blokkeren
+            dot_graph, current_all_data, current_added_nodes, current_added_edges, expansions = expansions.hidden_walk(current_all_data)
+            if key in expansions.nodes: return  # Al eerder onzichtbaar gevolgd
+            expansions.nodes[key] = target_node_id
+        dr_record = model.dr(dest_id)
+        dest_cols_recursive = _dr_destinations(dr_record.row) if dr_record is not None else []
+    else:
+        return
+
+    expansions.active.add(key)
+    for edge_lbl_recursive, dest_str_recursive in dest_cols_recursive:
+        if pd.notna(dest_str_recursive) and str(dest_str_recursive).strip():
+            draw_destination_refactored(dot_graph, target_node_id, edge_lbl_recursive, dest_str_recursive, current_all_data,
+                                        context, flow_context_for_csv, users_in_flow_set, users_in_flow_data_list,
+                                        current_added_nodes, current_added_edges, expansions, depth + 1, max_depth)
+    expansions.active.discard(key)
+
+
+def _dr_destinations(dr_info):
+    """(pijllabel, bestemming) van een DR die als sub-flow gevolgd wordt: tijdchecks, menu en default."""
+    dest_cols_recursive = [("Office Closed", dr_info.get("When office is closed route to", np.nan)),
+                         ("On Break", dr_info.get("When on break route to", np.nan)),
+                         ("On Holiday", dr_info.get(next((col for col in ["When on holiday route to", "When on holiday route to "] if col in dr_info), "non_existing_col"), np.nan))]
+    menu_options_exist = False
+    for i in range(10):
+         menu_col = f"Menu {i}"
+         if menu_col in dr_info and pd.notna(dr_info[menu_col]) and str(dr_info[menu_col]).strip():
+            dest_cols_recursive.append((f"Menu {i}", dr_info.get(menu_col, np.nan)))
+            menu_options_exist = True
+
+    if menu_options_exist:
+        dest_cols_recursive.append(("Timeout/Default", dr_info.get("Send call to", np.nan)))
+        invalid_dest_val = dr_info.get("Invalid input destination", np.nan)
+        # Voeg Invalid Input alleen toe als het verschilt van de default Send call to
+        if pd.notna(invalid_dest_val) and invalid_dest_val != dr_info.get("Send call to", np.nan):
+             dest_cols_recursive.append(("Invalid Input", invalid_dest_val))
+    else: # Geen menu, alleen default
+        dest_cols_recursive.append(("Direct", dr_info.get("Send call to", np.nan)))
+    return dest_cols_recursive
+
+
+def onderdeel_safe_name(onderdeel_naam):
+    return re.sub(r'\W+', '_', str(onderdeel_naam))
+
+
+def _add_edge(flow, added_edges, tail, head, label=None):
+    """Voegt een pijl toe als die nog niet bestaat (sleutel zonder label voor pijlen zonder label)."""
+    edge_key = (tail, head) if label is None else (tail, head, label)
+    if edge_key not in added_edges:
+        flow.edge(tail, head, label=label)
+        added_edges.add(edge_key)
+
+
+def _draw_dr_entry(flow, dr_row, dr_node_id, dr_ext_str, all_data, context_id, flow_context_csv,
+                   users_in_flow_set, added_nodes, added_edges):
+    """
+    Tekent vanaf de knoop van een start-DR de tijdchecks (kantooruren, pauze, vakantie)
+    en het menu, en volgt alle bestemmingen; gedeeld door de Onderdeel- en de individuele flows.
+    """
+    has_menu = _has_menu(dr_row)
+    ivr_timeout_info = _timeout_info(dr_row, has_menu)
+
+    def check_node(prefix, label):
+        node_id = make_node_id_refactored(prefix, dr_ext_str, context_id)
+        _, shape, color, _ = get_node_label_and_style("", "Check", all_data)
+        create_or_get_node_refactored(flow, node_id, label, added_nodes, shape=shape, fillcolor=color, node_type="Check")
+        return node_id
+
+    # Sub-flows worden per start-DR één keer uitgewerkt; een verwijzing terug naar de start-DR is een cyclus
+    expansions = _Expansions(nodes={("DR", dr_ext_str): dr_node_id}, active={("DR", dr_ext_str)})
+
+    def follow(source_node_id, edge_label, dest_string):
+        draw_destination_refactored(flow, source_node_id, edge_label, dest_string, all_data, context_id, flow_context_csv,
+                                    users_in_flow_set, flow.users, added_nodes, added_edges, expansions, depth=1)
+
+    # Bestemmingen vanuit de DR (via de tijdchecks)
+    holiday_col = next((col for col in ["When on holiday route to", "When on holiday route to "] if col in dr_row.index), "non_existing_col")
+    dest_strings_dr = {
+        'closed': dr_row.get("When office is closed route to", np.nan),
+        'break': dr_row.get("When on break route to", np.nan),
+        'holiday': dr_row.get(holiday_col, np.nan)
+    }
+
+    # DR -> "Binnen kantooruren?"; Nee: gesloten-bestemming
+    office_check_node_id = check_node("OFFICECHECK", "Binnen kantooruren?")
+    _add_edge(flow, added_edges, dr_node_id, office_check_node_id)
+    follow(office_check_node_id, "Nee (Gesloten)", dest_strings_dr['closed'])
+
+    # Ja -> "Pauze actief?"; Ja: pauze-bestemming
+    break_check_node_id = check_node("BREAKCHECK", "Pauze actief?")
+    _add_edge(flow, added_edges, office_check_node_id, break_check_node_id, "Ja")
+    follow(break_check_node_id, "Ja (Pauze)", dest_strings_dr['break'])
+
+    # Nee -> "Vakantie actief?"; Ja: vakantie-bestemming
+    holiday_check_node_id = check_node("HOLIDAYCHECK", "Vakantie actief?")
+    _add_edge(flow, added_edges, break_check_node_id, holiday_check_node_id, "Nee")
+    follow(holiday_check_node_id, "Ja (Vakantie)", dest_strings_dr['holiday'])
+
+    # Nee -> menu of directe actie binnen kantooruren
+    in_hours_node_id = make_node_id_refactored("INHOURS", dr_ext_str, context_id)
+    in_hours_label = "Actie binnen kantooruren" if not has_menu else "🎶 Menu speelt..."
+    create_or_get_node_refactored(flow, in_hours_node_id, in_hours_label, added_nodes, shape='ellipse', fillcolor='lightgrey', node_type="InHoursAction")
+    _add_edge(flow, added_edges, holiday_check_node_id, in_hours_node_id, "Nee")
+
+    menu_options_dr = []
+    if has_menu:
+        for i in range(10):
+            menu_dest_val = dr_row.get(f"Menu {i}", np.nan)
+            if pd.notna(menu_dest_val) and str(menu_dest_val).strip():
+                menu_options_dr.append((f"Kies {i}", menu_dest_val))
+        menu_options_dr.append(("Timeout" + ivr_timeout_info.replace('\\n', ' ') + " / Geen invoer", dr_row.get("Send call to", np.nan)))
+        invalid_dest_dr = dr_row.get("Invalid input destination", np.nan)
+        # Invalid Input alleen als het verschilt van de default Send call to
+        if pd.notna(invalid_dest_dr) and invalid_dest_dr != dr_row.get("Send call to", np.nan):
+            menu_options_dr.append(("Invalid Input", invalid_dest_dr))
+    else: # Geen menu
+        menu_options_dr.append(("Direct", dr_row.get("Send call to", np.nan)))
+
+    for edge_lbl, dest_s in menu_options_dr:
+        if pd.notna(dest_s) and str(dest_s).strip():
+            follow(in_hours_node_id, edge_lbl, dest_s)
+
+
+def _timeout_info(dr_row, has_menu):
+    """Regel met de menu-timeout voor in het DR-label (DOT-escape), of '' zonder menu of timeout."""
+    ivr_timeout_num = pd.to_numeric(dr_row.get("If no input within seconds", None), errors='coerce')
+    return f"\\nTimeout: {int(ivr_timeout_num)}s" if has_menu and pd.notna(ivr_timeout_num) else ""
+
+
+def _has_menu(dr_row):
+    return any(pd.notna(dr_row.get(f"Menu {i}")) and str(dr_row.get(f"Menu {i}")).strip() for i in range(10))
+
+
+@instrument.timed("build_onderdeel_flow", lambda onderdeel_naam, *_: {"onderdeel": str(onderdeel_naam)})
+def build_onderdeel_flow(onderdeel_naam, onderdeel_group_df, all_data):
+    """
+    Bouwt de gecombineerde flow voor één Onderdeel, startend bij de primaire DR(s).
+    Returns: Flow (knopen, pijlen en gebruikersrijen voor de CSV-export)
+    """
+    onderdeel_safe_name_str = onderdeel_safe_name(onderdeel_naam)
+    flow = Flow(name=f'Flow_Onderdeel_{onderdeel_safe_name_str}', comment=f'Call Flow for Onderdeel {onderdeel_naam}')
+    added_nodes, added_edges = set(), set()
+    users_in_flow_set = set()
+    flow_context_csv = onderdeel_naam # Gebruik de naam van het onderdeel als context
+
+    onderdeel_node_id = make_node_id_refactored("ONDERDEEL", onderdeel_safe_name_str, onderdeel_safe_name_str)
+    create_or_get_node_refactored(flow, onderdeel_node_id, f"🏢 Onderdeel:\n{onderdeel_naam}", added_nodes, shape='tab', fillcolor='lightblue', node_type="Onderdeel")
+
+    primaire_drs_in_onderdeel = onderdeel_group_df[onderdeel_group_df['Primair/Secundair'] == 'Primair']
+    start_drs_df = primaire_drs_in_onderdeel
+    start_label_prefix = "Start bij Primaire DR:"
+    if primaire_drs_in_onderdeel.empty:
+        start_drs_df = onderdeel_group_df # Alle DRs in onderdeel als geen primaire
+        start_label_prefix = "Start bij DR:"
+
+    for _, dr_row in start_drs_df.iterrows():
+        dr_name = dr_row.get("Digital Receptionist Name", "Naamloos")
+        dr_ext = dr_row.get("Virtual Extension Number", "GEEN_EXT")
+        if dr_ext == "GEEN_EXT" or pd.isna(dr_ext): continue
+        dr_ext_str = str(dr_ext)
+        context_id = f"{onderdeel_safe_name_str}_{dr_ext_str}"
+
+        # Label met de naam uit deze rij; vorm en kleur (en markering) zoals elke DR-knoop
+        dr_node_id = make_node_id_refactored("DR", dr_ext_str, context_id)
+        _, dr_shape, dr_color, dr_node_type = get_node_label_and_style(dr_ext_str, "DR", all_data)
+        dr_label = f"🚦 IVR: {dr_name}\n({dr_ext_str}){_timeout_info(dr_row, _has_menu(dr_row))}"
+        create_or_get_node_refactored(flow, dr_node_id, dr_label, added_nodes, shape=dr_shape, fillcolor=dr_color, node_type=dr_node_type)
+        _add_edge(flow, added_edges, onderdeel_node_id, dr_node_id, start_label_prefix)
+
+        _draw_dr_entry(flow, dr_row, dr_node_id, dr_ext_str, all_data, context_id, flow_context_csv,
+                       users_in_flow_set, added_nodes, added_edges)
+    return flow
+
+
+def individual_flow_context(dr):
+    """Naam en extensie (str) van een individuele DR, of None als de DR geen extensie heeft."""
+    dr_name = dr.get("Digital Receptionist Name", "Naamloos")
+    dr_ext = dr.get("Virtual Extension Number", "GEEN_EXT")
+    if dr_ext == "GEEN_EXT" or pd.isna(dr_ext): return None
+    return dr_name, str(dr_ext)
+
+
+@instrument.timed("build_individual_flow", lambda dr, *_: {"dr": str(dr.get("Virtual Extension Number"))})
+def build_individual_flow(dr, all_data):
+    """
+    Bouwt de flow voor één DR zonder (geldig) Onderdeel.
+    Returns: Flow (knopen, pijlen en gebruikersrijen voor de CSV-export)
+    """
+    dr_name, dr_ext_str = individual_flow_context(dr)
+    context_id = dr_ext_str
+    flow = Flow(name=f'Flow_Indiv_{dr_ext_str}', comment=f'Individual Call Flow for {dr_name}')
+    added_nodes, added_edges = set(), set()
+    flow_context_csv = f"IVR_{dr_ext_str}_{dr_name.replace(' ','_')}" # Context voor CSV
+
+    # Label uit het model (naam van de eerste DR met deze extensie), met de naam uit deze rij als er een timeout is
+    dr_node_id = make_node_id_refactored("DR", dr_ext_str, context_id)
+    dr_label, dr_shape, dr_color, dr_node_type = get_node_label_and_style(dr_ext_str, "DR", all_data)
+    ivr_timeout_info = _timeout_info(dr, _has_menu(dr))
+    if ivr_timeout_info and ivr_timeout_info not in dr_label:
+        dr_label = f"🚦 IVR: {dr_name}\n({dr_ext_str}){ivr_timeout_info}"
+    create_or_get_node_refactored(flow, dr_node_id, dr_label, added_nodes, shape=dr_shape, fillcolor=dr_color, node_type=dr_node_type)
+
+    _draw_dr_entry(flow, dr, dr_node_id, dr_ext_str, all_data, context_id, flow_context_csv,
+                   set(), added_nodes, added_edges)
+    return flow
+
+
+def users_flow_csv(users_in_flow_data_list):
+    """
+    Zet de verzamelde gebruikersrijen van een flow om naar CSV (bytes).
+    Returns: tuple (csv_bytes, aantal regels)
+    """
+    df_users = pd.DataFrame(users_in_flow_data_list)
+    # Verwijder duplicaten op User Number, behoud de eerste keer dat de user werd gevonden
+    if "User Number" in df_users.columns:
+        df_users.drop_duplicates(subset=["User Number"], keep='first', inplace=True)
+    return df_users.to_csv(index=False).encode('utf-8'), len(df_users)
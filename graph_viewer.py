@@ -0,0 +1,238 @@
+"""
+JSON-export van flows en een interactieve viewer die in de browser layout.
+
+`graph_json` zet een `flows.Flow` om naar compacte JSON: knopen (id,
+label, type, vorm, kleur), met elk label maar één keer opgeslagen (grote
+wachtrijen komen in een flow vaak meerdere keren voor), en pijlen als
+[bron, doel, label] met knoopnummers. `viewer_html` verpakt die JSON in een
+zelfstandige HTML-pagina (zonder externe scripts) voor
+`st.iframe` of als los bestand. De viewer legt alleen de
+zichtbare knopen neer, in kolommen per stap vanaf de start. Klik op een knoop
+klapt de vervolgstappen in of uit, en de layout wordt dan bijgewerkt. Dubbelklik
+toont het volledige label. Slepen verschuift de flow en scrollen zoomt. De
+server hoeft niets te layouten.
+"""
+import json
+import re
+
+VIEWER_HEIGHT = 600  # Hoogte van de viewer in pixels
+
+
+def graph_json(flow):
+    """
+    JSON-back end van een Flow.
+    Returns: compacte JSON-string met `name`, `labels`, `nodes` (label als index in
+    `labels`) en `edges` ([bron, doel, label] plus 1 voor een cyclus; bron en doel als index in `nodes`).
+    """
+    graph = flow.to_dict()
+    labels = {}
+    nodes = [dict(node, label=labels.setdefault(node["label"], len(labels))) for node in graph["nodes"]]
+    index = {node["id"]: i for i, node in enumerate(nodes)}
+    edges = [[index[edge["source"]], index[edge["target"]], edge.get("label", "")] + ([1] if edge.get("cycle") else [])
+             for edge in graph["edges"] if edge["source"] in index and edge["target"] in index]
+    return json.dumps({"name": graph["name"], "labels": list(labels), "nodes": nodes, "edges": edges},
+                      ensure_ascii=False, separators=(",", ":"))
+
+
+def viewer_html(flow, max_members=None, max_depth=None, max_nodes=None, height=VIEWER_HEIGHT, graph=None):
+    """
+    HTML-pagina met de flow in de interactieve viewer.
+    max_members / max_depth / max_nodes: begintoestand zoals `DetailLevel` (ledenlijsten en DR's ingeklapt).
+    graph: al berekende `graph_json(flow)`, bv. uit de cache van de app
+    """
+    options = {"maxMembers": max_members, "maxDepth": max_depth, "maxNodes": max_nodes, "height": height}
+    # "</" escapen zodat een label de <script>-tag niet kan afsluiten
+    payload = (graph if graph is not None else graph_json(flow)).replace("</", "<\\/")
+    values = {"GRAPH": payload, "OPTIONS": json.dumps(options), "HEIGHT": str(height)}
+    # Eén pass over alleen de template: tokens in labels (de payload) blijven ongemoeid
+    return _PLACEHOLDER.sub(lambda m: values[m.group(1)], _TEMPLATE)
+
+
+_PLACEHOLDER = re.compile(r"__(GRAPH|OPTIONS|HEIGHT)__")
+
+
+_TEMPLATE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8">
+<style>
+  body { margin: 0; font-family: Arial, sans-serif; }
+  #bar { position: absolute; top: 6px; left: 6px; z-index: 1; font-size: 12px; }
+  #bar button { font-size: 12px; margin-right: 4px; }
+  #bar span { color: #555; margin-left: 6px; }
+  svg { width: 100%; height: __HEIGHT__px; cursor: grab; background: #fff; border: 1px solid #ddd; box-sizing: border-box; }
+  .node { cursor: pointer; transition: transform 0.25s; }
+  .node text { font-size: 11px; }
+  .edge { fill: none; stroke: #777; stroke-width: 1; }
+  .edge.cycle { stroke: #aaa; stroke-dasharray: 4 3; }
+  .elabel { font-size: 9px; fill: #444; }
+  .badge { font-size: 10px; font-weight: bold; fill: #333; }
+</style></head>
+<body>
+<div id="bar">
+  <button id="fit">Passend</button><button id="all">Alles uitklappen</button><button id="reset">Begintoestand</button>
+  <span id="info"></span>
+</div>
+<svg id="svg"><defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="7" markerHeight="7" orient="auto">
+  <path d="M0,0 L10,5 L0,10 z" fill="#777"/></marker></defs><g id="view"><g id="edges"></g><g id="nodes"></g></g></svg>
+<script>
+const RAW = __GRAPH__;
+const G = { nodes: RAW.nodes.map(n => Object.assign({}, n, { label: RAW.labels[n.label] })) };
+G.edges = RAW.edges.map(([s, t, label, cycle]) => ({ source: G.nodes[s].id, target: G.nodes[t].id, label, cycle: !!cycle }));
+const OPT = __OPTIONS__;
+const NS = "http://www.w3.org/2000/svg";
+const LINE = 13, PAD = 6, COL_GAP = 90, ROW_GAP = 14;
+const byId = new Map(G.nodes.map(n => [n.id, n]));
+const out = new Map(G.nodes.map(n => [n.id, []]));
+const indeg = new Map(G.nodes.map(n => [n.id, 0]));
+for (const e of G.edges) {
+  if (!byId.has(e.source) || !byId.has(e.target)) continue;
+  out.get(e.source).push(e);
+  indeg.set(e.target, indeg.get(e.target) + 1);
+}
+let roots = G.nodes.filter(n => indeg.get(n.id) === 0).map(n => n.id);
+if (!roots.length && G.nodes.length) roots = [G.nodes[0].id];
+
+const ctx = document.createElement("canvas").getContext("2d");
+ctx.font = "11px Arial";
+const lines = n => String(n.label || n.id).split(/\\n|\\\\n/);
+const fullLabel = new Set();
+function shownLines(n) {
+  const all = lines(n);
+  if (OPT.maxMembers == null || fullLabel.has(n.id) || all.length <= OPT.maxMembers + 3) return all;
+  return all.slice(0, 3).concat([`… ${all.length - 3} regels (dubbelklik)`]);
+}
+
+// Begintoestand: zoals DetailLevel, DR's dieper dan maxDepth en alles na maxNodes knopen ingeklapt
+let expanded = new Set();
+function initialState() {
+  expanded = new Set(); fullLabel.clear();
+  const drDepth = new Map(roots.map(id => [id, 0]));
+  const queue = roots.slice(); let count = roots.length;
+  while (queue.length) {
+    const id = queue.shift(), n = byId.get(id);
+    const deep = n.type === "DR" && OPT.maxDepth != null && drDepth.get(id) > OPT.maxDepth;
+    if (n.folded || deep || (OPT.maxNodes != null && count >= OPT.maxNodes)) continue;
+    expanded.add(id);
+    for (const e of out.get(id)) {
+      if (drDepth.has(e.target)) continue;
+      drDepth.set(e.target, drDepth.get(id) + (byId.get(e.target).type === "DR" ? 1 : 0));
+      queue.push(e.target); count++;
+    }
+  }
+}
+
+// Zichtbare deelgraaf: BFS vanaf de starts, alleen door uitgeklapte knopen
+function visibleGraph() {
+  const layer = new Map(roots.map(id => [id, 0])), order = roots.slice(), edges = [];
+  for (let i = 0; i < order.length; i++) {
+    const id = order[i];
+    if (!expanded.has(id)) continue;
+    for (const e of out.get(id)) {
+      if (!layer.has(e.target)) { layer.set(e.target, layer.get(id) + 1); order.push(e.target); }
+      edges.push(e);
+    }
+  }
+  return { layer, order, edges };
+}
+
+const pos = new Map();
+function layout(vis) {
+  const cols = [];
+  for (const id of vis.order) {
+    const n = byId.get(id), ls = shownLines(n);
+    const w = Math.max(...ls.map(l => ctx.measureText(l).width)) + 2 * PAD + (out.get(id).length ? 14 : 0);
+    const h = ls.length * LINE + 2 * PAD;
+    (cols[vis.layer.get(id)] = cols[vis.layer.get(id)] || []).push({ id, w, h, ls });
+  }
+  let x = 20;
+  for (const col of cols) {
+    if (!col) continue;
+    let y = 40; const colW = Math.max(...col.map(c => c.w));
+    for (const c of col) { pos.set(c.id, { x, y, w: c.w, h: c.h, ls: c.ls }); y += c.h + ROW_GAP; }
+    x += colW + COL_GAP;
+  }
+}
+
+function el(tag, attrs, parent) {
+  const e = document.createElementNS(NS, tag);
+  for (const k in attrs) e.setAttribute(k, attrs[k]);
+  if (parent) parent.appendChild(e);
+  return e;
+}
+
+const nodeLayer = document.getElementById("nodes"), edgeLayer = document.getElementById("edges");
+const nodeEls = new Map();
+function draw() {
+  const vis = visibleGraph();
+  layout(vis);
+  edgeLayer.textContent = "";
+  for (const e of vis.edges) {
+    const a = pos.get(e.source), b = pos.get(e.target);
+    const back = vis.layer.get(e.target) <= vis.layer.get(e.source);
+    const x1 = a.x + a.w, y1 = a.y + a.h / 2, x2 = b.x, y2 = b.y + b.h / 2;
+    const d = back ? `M${a.x + a.w / 2},${a.y} C${a.x + a.w / 2},${a.y - 40} ${b.x + b.w / 2},${b.y - 40} ${b.x + b.w / 2},${b.y}`
+                   : `M${x1},${y1} C${x1 + COL_GAP / 2},${y1} ${x2 - COL_GAP / 2},${y2} ${x2},${y2}`;
+    el("path", { d, class: "edge" + (e.cycle || back ? " cycle" : ""), "marker-end": "url(#arrow)" }, edgeLayer);
+    if (e.label) {
+      const t = el("text", { x: back ? (a.x + b.x + b.w) / 2 : x2 - COL_GAP / 2, y: back ? Math.min(a.y, b.y) - 32 : (y1 + y2) / 2 - 3,
+                             "text-anchor": "middle", class: "elabel" }, edgeLayer);
+      t.textContent = e.label;
+    }
+  }
+  const shown = new Set(vis.order);
+  for (const [id, g] of nodeEls) if (!shown.has(id)) { g.remove(); nodeEls.delete(id); }
+  for (const id of vis.order) {
+    const n = byId.get(id), p = pos.get(id);
+    let g = nodeEls.get(id);
+    if (g) g.textContent = "";
+    else {
+      g = el("g", { class: "node" }, nodeLayer);
+      g.addEventListener("click", ev => { ev.stopPropagation(); toggle(id); });
+      g.addEventListener("dblclick", ev => { ev.stopPropagation(); fullLabel.has(id) ? fullLabel.delete(id) : fullLabel.add(id); draw(); });
+      nodeEls.set(id, g);
+    }
+    g.style.transform = `translate(${p.x}px,${p.y}px)`;
+    const rx = n.shape === "ellipse" || n.shape === "cylinder" ? 14 : 4;
+    el("rect", { width: p.w, height: p.h, rx, fill: n.color || "lightblue", stroke: "#555",
+                 "stroke-dasharray": n.folded || (out.get(id).length && !expanded.has(id)) ? "4 2" : "" }, g);
+    el("title", {}, g).textContent = lines(n).join("\\n");
+    p.ls.forEach((l, i) => { el("text", { x: PAD, y: PAD + (i + 1) * LINE - 3 }, g).textContent = l; });
+    if (out.get(id).length) el("text", { x: p.w - 11, y: 13, class: "badge" }, g).textContent = expanded.has(id) ? "−" : "+";
+  }
+  document.getElementById("info").textContent =
+    `${vis.order.length} van ${G.nodes.length} knopen zichtbaar — klik: in/uitklappen, dubbelklik: volledig label`;
+}
+
+function toggle(id) {
+  if (!out.get(id).length) return;
+  expanded.has(id) ? expanded.delete(id) : expanded.add(id);
+  draw();
+}
+
+// Pannen en zoomen
+const svg = document.getElementById("svg"), view = document.getElementById("view");
+let tx = 0, ty = 0, scale = 1, drag = null;
+const apply = () => view.setAttribute("transform", `translate(${tx},${ty}) scale(${scale})`);
+svg.addEventListener("pointerdown", ev => {
+  if (ev.target.closest(".node")) return;  // Klikken op een knoop is in/uitklappen, geen slepen
+  drag = { x: ev.clientX - tx, y: ev.clientY - ty }; svg.setPointerCapture(ev.pointerId);
+});
+svg.addEventListener("pointermove", ev => { if (drag) { tx = ev.clientX - drag.x; ty = ev.clientY - drag.y; apply(); } });
+svg.addEventListener("pointerup", () => { drag = null; });
+svg.addEventListener("wheel", ev => {
+  ev.preventDefault();
+  const f = Math.exp(-ev.deltaY * 0.0015), r = svg.getBoundingClientRect();
+  const mx = ev.clientX - r.left, my = ev.clientY - r.top;
+  tx = mx - (mx - tx) * f; ty = my - (my - ty) * f; scale *= f; apply();
+}, { passive: false });
+function fit() {
+  let w = 0, h = 0;
+  for (const id of nodeEls.keys()) { const p = pos.get(id); w = Math.max(w, p.x + p.w); h = Math.max(h, p.y + p.h); }
+  const r = svg.getBoundingClientRect();
+  scale = Math.min(1, (r.width - 20) / (w || 1), (r.height - 20) / (h || 1)); tx = 10; ty = 10; apply();
+}
+document.getElementById("fit").onclick = fit;
+document.getElementById("all").onclick = () => { expanded = new Set(G.nodes.map(n => n.id)); draw(); fit(); };
+document.getElementById("reset").onclick = () => { initialState(); draw(); fit(); };
+initialState(); draw(); fit();
+</script></body></html>
+"""
@@ -0,0 +1,397 @@
+"""
+Inlezen van een 3CX-export (ZIP met CSV's) naar DataFrames en het geïndexeerde model.
+
+Onafhankelijk van Streamlit; de app geeft een `report` callback mee die de
+meldingen als st.error/st.warning/... toont.
+"""
+import csv
+import hashlib
+import io
+import logging
+import os
+import pickle
+import sys
+import zipfile
+
+import pandas as pd
+
+import instrument
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # Optioneel: zonder pyarrow leest de C-parser van pandas alle bestanden
+    pa = pa_csv = None
+
+from callgraph import build_call_graph_model, normalize_onderdeel, DR_DESTINATION_COLUMNS
+from diskcache import DiskCache
+from nummers import parse_nummerblok_ranges, NummerblokIndex
+from reachability import ReachabilityEngine
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_DIR = os.environ.get(
+    "CALLFLOW_SNAPSHOT_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "3cx_callflow", "snapshots"))
+SNAPSHOT_MAX_BYTES = int(os.environ.get("CALLFLOW_SNAPSHOT_CACHE_MB", "512")) * 1024 * 1024
+# Modules waarvan de code de vorm van een snapshot bepaalt; een wijziging maakt oude snapshots ongeldig
+_SNAPSHOT_MODULES = ("ingest.py", "callgraph.py", "nummers.py", "reachability.py")
+# Kolommen die de app per bestand gebruikt; bestanden die hier niet staan worden volledig gelezen
+# (Users.csv gaat met alle kolommen mee in de gebruikers-CSV). Van Receptionists.csv wordt de
+# eerste kolom altijd gelezen (Onderdeel), van wachtrijen en belgroepen alle 'User N' kolommen.
+USED_COLUMNS = {
+    "receptionists": {"Onderdeel", "Primair/Secundair", "Digital Receptionist Name", "Virtual Extension Number",
+                      "If no input within seconds", *DR_DESTINATION_COLUMNS},
+    "queues": {"Virtual Extension Number", "Queue Name", "Ring time (s)", "Max queue wait time (s)",
+               "Destination if no answer"},
+    "ringgroups": {"Virtual Extension Number", "Ring Group Name", "Ring time (s)", "Max queue wait time (s)",
+                   "Destination if no answer"},
+    "trunks": set(),  # Wordt (nog) niet gebruikt; alleen de header wordt gelezen (zie `read_export_csv`)
+    "trunksreeksen": {"DID Number", "DID nummer (E.136)", "Startreeks", "Eindreeks", "Nummerblok"},
+}
+# Compacte ingest: tekstkolommen met hooguit zoveel verschillende waarden per rij worden categorisch
+# (bv. Department, Onderdeel, Primair/Secundair, ringtijden); extensies en namen blijven strings
+CATEGORY_MAX_RATIO = 0.5
+# Zelfde NaN-waarden als de standaard van pd.read_csv, zodat beide parsers hetzelfde opleveren
+_NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+              "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+_SNIFF_BYTES = 64 * 1024
+_LOG_LEVELS = {"error": logging.ERROR, "warning": logging.WARNING, "info": logging.INFO, "success": logging.INFO}
+
+
+def log_report(niveau, tekst):
+    """Standaard `report` callback: schrijft meldingen naar de logger."""
+    logger.log(_LOG_LEVELS.get(niveau, logging.INFO), tekst)
+
+
+def compact_frame(df, max_ratio=CATEGORY_MAX_RATIO):
+    """
+    Zet (in place) tekstkolommen met weinig verschillende waarden om naar categorisch.
+    Waarden blijven dezelfde strings; rijen in het model delen daardoor ook de string-objecten.
+    Returns: lijst van omgezette kolommen
+    """
+    omgezet = []
+    if len(df) < 2:
+        return omgezet
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype) or not (values.dtype == object or pd.api.types.is_string_dtype(values)):
+            continue
+        if values.nunique() <= len(values) * max_ratio:
+            df[col] = values.astype("category")
+            omgezet.append(col)
+    return omgezet
+
+
+def sniff_csv_header(raw):
+    """
+    Bepaalt scheidingsteken (';' of ',') en kolomnamen uit de eerste regel van een CSV (bytes).
+    Returns: tuple (scheidingsteken, lijst van kolomnamen)
+    """
+    first_line = raw[:_SNIFF_BYTES].decode('utf-8-sig', errors='replace').splitlines()[:1]
+    first_line = first_line[0] if first_line else ""
+    sep = ";" if first_line.count(";") >= first_line.count(",") else ","
+    header = next(csv.reader([first_line], delimiter=sep), [])
+    return sep, header
+
+
+def _used_columns(key, header):
+    """Kolommen uit `header` die voor bestand `key` gelezen moeten worden, in bestandsvolgorde (None = alle)."""
+    wanted = USED_COLUMNS.get(key)
+    if wanted is None:
+        return None
+    return [col for pos, col in enumerate(header)
+            if col in wanted or col.startswith("User ") and key in ("queues", "ringgroups")
+            or pos == 0 and key == "receptionists"]
+
+
+def _read_csv_pyarrow(raw, sep, header, usecols):
+    options = pa_csv.ConvertOptions(column_types={col: pa.string() for col in header}, null_values=_NA_VALUES,
+                                    strings_can_be_null=True, include_columns=usecols)
+    table = pa_csv.read_csv(pa.BufferReader(raw), parse_options=pa_csv.ParseOptions(delimiter=sep, newlines_in_values=True),
+                            convert_options=options)
+    return table.to_pandas()
+
+
+def read_export_csv(raw, key=None):
+    """
+    Leest één CSV uit de export (bytes) in één pass: scheidingsteken gesnuffeld uit de
+    eerste regel, alle kolommen als string (extensies en nummers houden zo hun exacte
+    vorm, zonder '.0' of weggevallen voorloopnullen) en alleen de kolommen uit
+    `USED_COLUMNS` (bij een lege set alleen de header, zonder rijen). Gebruikt pyarrow
+    als dat geïnstalleerd is; bij bestanden die pyarrow niet aankan (rafelige rijen,
+    dubbele kolomnamen) valt het terug op de C-parser.
+    Returns: tuple (DataFrame, scheidingsteken)
+    """
+    sep, header = sniff_csv_header(raw)
+    usecols = _used_columns(key, header)
+    if usecols == []:
+        # Geen kolommen nodig: niet parsen (pyarrow leest bij include_columns=[] juist alles)
+        return pd.DataFrame(columns=header, dtype=str), sep
+    if pa_csv is not None and header and len(set(header)) == len(header):
+        try:
+            return _read_csv_pyarrow(raw, sep, header, usecols), sep
+        except (pa.ArrowException, ValueError) as e:
+            logger.debug("pyarrow kon %s niet lezen, terugval op pandas: %s", key, e)
+    return pd.read_csv(io.BytesIO(raw), sep=sep, dtype=str, usecols=usecols), sep
+
+
+@instrument.timed("load_data_from_zip")
+def load_data_from_zip(zip_file_bytes, report=None, compact=True, fingerprint=None):
+    """
+    Leest de 3CX CSV-exports uit een ZIP (bytes) en bereidt ze voor.
+    Meldingen gaan naar `report(niveau, tekst)` met niveau 'error', 'warning',
+    'info' of 'success'; standaard naar de logger van deze module.
+    compact: kolommen met weinig verschillende waarden categorisch opslaan (`compact_frame`)
+    en 'receptionists_all' niet als kopie maar als dezelfde DataFrame als 'receptionists'.
+    fingerprint: SHA-256 (hex) van de ZIP als die al bekend is; anders wordt die hier berekend.
+    Returns: dict met DataFrames, nummerblok ranges/index, het geïndexeerde model, de bereikbaarheid
+    en 'fingerprint' (sleutel voor alle afgeleide caches), of None.
+    """
+    if report is None: report = log_report
+    data = {}
+    required_files = {
+        "receptionists": "Receptionists.csv", "queues": "Queues.csv",
+        "ringgroups": "ringgroups.csv", "users": "Users.csv",
+        "trunks": "Trunks.csv",
+        "trunksreeksen": "trunksreeksen.csv"
+    }
+    all_files_found = True; loaded_files = []; missing_files = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(zip_file_bytes), 'r') as zf:
+            zip_base_filenames = {os.path.basename(f) for f in zf.namelist()}
+            for key, filename in required_files.items():
+                if filename in zip_base_filenames:
+                    actual_zip_path = next((f for f in zf.namelist() if os.path.basename(f) == filename), None)
+                    if actual_zip_path:
+                        try:
+                            raw = zf.read(actual_zip_path)
+                            try:
+                                with instrument.span("read_export_csv", bestand=filename): df, _ = read_export_csv(raw, key)
+                            except Exception as e_read:
+                                report("error", f"Kon {filename} niet lezen (scheidingsteken '{sniff_csv_header(raw)[0]}'): {e_read}")
+                                df = None
+                                if key == "trunksreeksen": report("warning", f"Optioneel bestand {filename} kon niet worden gelezen.")
+                                else: all_files_found = False 
+                            
+                            if df is not None:
+                                data[key] = df
+                                loaded_files.append(filename)
+                        except Exception as e_outer:
+                             report("error", f"Onverwachte fout bij lezen {filename}: {e_outer}")
+                             if key != "trunksreeksen": all_files_found = False 
+                elif key != "trunksreeksen":
+                    missing_files.append(filename);
+                    if key in ["receptionists", "queues", "ringgroups", "users"]: all_files_found = False
+            
+            if "trunksreeksen.csv" in zip_base_filenames and "trunksreeksen" not in data:
+                 report("warning", "Bestand trunksreeksen.csv is aanwezig in ZIP, maar kon niet worden ingelezen.")
+
+        if not all_files_found: report("error", f"Essentiële bestanden missen: {', '.join(missing_files)}"); return None
+
+        # Data Voorbereiding
+        if "receptionists" in data:
+            receptionists_df = data['receptionists']
+            if receptionists_df.shape[1] > 0:
+                first_col_name = receptionists_df.columns[0]
+                if first_col_name != 'Onderdeel':
+                    report("info", f"Eerste kolom '{first_col_name}' in Receptionists.csv wordt gebruikt als 'Onderdeel'.")
+                    receptionists_df = receptionists_df.rename(columns={first_col_name: 'Onderdeel'})
+                    data['receptionists'] = receptionists_df
+            if compact: compact_frame(receptionists_df)
+            
+            if "Primair/Secundair" in receptionists_df.columns:
+                 data["receptionists_primary"] = receptionists_df[receptionists_df["Primair/Secundair"] == "Primair"]  # Filteren kopieert al
+            else: data["receptionists_primary"] = pd.DataFrame()
+            data["receptionists_all"] = receptionists_df if compact else receptionists_df.copy()
+        else: 
+            data["receptionists_primary"], data["receptionists_all"] = pd.DataFrame(), pd.DataFrame()
+            report("warning", "Receptionists.csv niet gevonden of leeg.")
+            
+        # Extensies en nummers zijn al strings (read_export_csv), casten en '.0' strippen is niet nodig
+        if "users" in data:
+            users = data['users']
+            if 'Full Name' in users.columns: users['Naam'] = users['Full Name']
+            elif 'Naam' not in users.columns and 'FirstName' in users.columns: users['Naam'] = users['FirstName'].fillna('') + ' ' + users['LastName'].fillna(''); users['Naam'] = users['Naam'].str.strip()
+            data['users'] = users
+        if compact:
+            for key in ("users", "queues", "ringgroups"):
+                if key in data: compact_frame(data[key])
+        
+        # --- Creëer Nummerblok Range Mapping --- 
+        nummerblok_ranges = []
+        if "trunksreeksen" in data:
+            trunks_df = data["trunksreeksen"]
+            # Kolomnamen voor ranges (kunnen variëren)
+            range_start_cols = ['DID Number', 'DID nummer (E.136)', 'Startreeks'] 
+            range_end_col = 'Eindreeks' # Aanname, of uit bestandsnaam parsen?
+            nummerblok_col = 'Nummerblok'
+            
+            # Vind de daadwerkelijke startkolom
+            did_col_start = next((col for col in range_start_cols if col in trunks_df.columns), None)
+            
+            if did_col_start and nummerblok_col in trunks_df.columns:
+                try:
+                    # Kolomsgewijs normaliseren en parsen, één keer bij het laden
+                    nummerblok_ranges = parse_nummerblok_ranges(trunks_df, did_col_start, nummerblok_col, range_end_col)
+                except Exception as e_range:
+                    report("warning", f"Kon ranges niet parsen in trunksreeksen.csv, Fout: {e_range}")
+                parsed_ranges = len(nummerblok_ranges)
+                
+                data["nummerblok_ranges"] = sorted(nummerblok_ranges) # Sorteer op startnummer
+                data["nummerblok_index"] = NummerblokIndex(data["nummerblok_ranges"])
+                report("info", f"{parsed_ranges} nummerblok ranges succesvol geparsed.")
+            else:
+                missing_cols = []
+                if not did_col_start: missing_cols.append("Start range ('DID Number'/'DID nummer (E.136)'/'Startreeks')")
+                if nummerblok_col not in trunks_df.columns: missing_cols.append("'Nummerblok'")
+                report("warning", f"'trunksreeksen.csv' mist benodigde kolommen: {', '.join(missing_cols)}. Nummerblok info niet beschikbaar.")
+                data["nummerblok_ranges"] = [] # Lege lijst
+                data["nummerblok_index"] = NummerblokIndex([])
+        else:
+            report("info", "'trunksreeksen.csv' niet gevonden. Nummerblok info niet beschikbaar.")
+            data["nummerblok_ranges"] = [] # Lege lijst
+            data["nummerblok_index"] = NummerblokIndex([])
+        # --- Einde Nummerblok Range Mapping --- 
+
+        # Lege Onderdelen als 'LEEG', zoals alle tabs ze tonen; één keer hier, zodat gecachete data niet meer
+        # verandert, en vóór het model, zodat de DR-records hetzelfde Onderdeel hebben als de tabel
+        if 'Onderdeel' in data["receptionists_all"].columns:
+            normalize_onderdeel(data["receptionists_all"])
+        # Geïndexeerd model voor alle lookups in flows en bereikbaarheid
+        with instrument.span("build_call_graph_model"): data["model"] = build_call_graph_model(data)
+        # Bereikbare gebruikers per DR/wachtrij/belgroep, gedeeld door tab 2 en 3
+        with instrument.span("ReachabilityEngine"): data["reachability"] = ReachabilityEngine(data["model"])
+        # Vingerafdruk van de inhoud: caches van afgeleide data gebruiken deze i.p.v. de DataFrames te hashen
+        data["fingerprint"] = fingerprint or hashlib.sha256(zip_file_bytes).hexdigest()
+
+        report("success", f"Succesvol geladen uit ZIP: {', '.join(loaded_files)}")
+        return data
+    except zipfile.BadZipFile: report("error", "Ongeldig ZIP-bestand."); return None
+    except Exception as e: report("error", f"Fout bij verwerken ZIP: {e}"); return None
+
+
+_snapshot_cache = None
+_code_fingerprint = None
+
+
+def default_snapshot_cache():
+    global _snapshot_cache
+    if _snapshot_cache is None:
+        _snapshot_cache = DiskCache(SNAPSHOT_CACHE_DIR, SNAPSHOT_MAX_BYTES)
+    return _snapshot_cache
+
+
+def snapshot_key(zip_sha256, compact=True):
+    """Sleutel van een snapshot: SHA-256 van de ZIP, de ingest-optie en een vingerafdruk van de ingest-code."""
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        digest = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for module in _SNAPSHOT_MODULES:
+            with open(os.path.join(here, module), 'rb') as f:
+                digest.update(f.read())
+        _code_fingerprint = digest.hexdigest()[:16]
+    variant = "" if compact else "\0volledig"
+    return hashlib.sha256(f"{zip_sha256}\0{_code_fingerprint}{variant}".encode('utf-8')).hexdigest()
+
+
+@instrument.timed("load_snapshot")
+def load_snapshot(zip_file_bytes, report=None, cache=None, zip_sha256=None, compact=True):
+    """
+    Als `load_data_from_zip`, maar met een persistente snapshot op schijf (pickle),
+    geadresseerd op de SHA-256 van de ZIP. Een warme start op dezelfde export slaat
+    het inlezen van de CSV's en het opbouwen van model en index volledig over; de
+    meldingen van de oorspronkelijke load worden opnieuw via `report` getoond.
+    """
+    if report is None: report = log_report
+    if cache is None: cache = default_snapshot_cache()
+    zip_sha256 = zip_sha256 or hashlib.sha256(zip_file_bytes).hexdigest()
+    key = snapshot_key(zip_sha256, compact)
+
+    blob = cache.get(key, 'pkl')
+    if blob is not None:
+        try:
+            meldingen, data = pickle.loads(blob)
+        except Exception as e:
+            logger.warning("Snapshot %s onleesbaar, opnieuw inlezen: %s", key[:12], e)
+        else:
+            for niveau, tekst in meldingen: report(niveau, tekst)
+            instrument.count("cache.snapshot.hits")
+            return data
+
+    instrument.count("cache.snapshot.misses")
+    meldingen = []
+    def collect(niveau, tekst):
+        meldingen.append((niveau, tekst))
+        report(niveau, tekst)
+    data = load_data_from_zip(zip_file_bytes, report=collect, compact=compact, fingerprint=zip_sha256)
+    if data:
+        try:
+            cache.put(key, pickle.dumps((meldingen, data), protocol=pickle.HIGHEST_PROTOCOL), 'pkl')
+        except OSError as e:
+            logger.warning("Snapshot kon niet worden opgeslagen: %s", e)
+    return data
+
+
+def _deep_size(root, seen):
+    """Geschatte grootte in bytes van alles onder `root` dat nog niet in `seen` (ids) staat."""
+    size = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, pd.DataFrame):
+            size += int(obj.index.memory_usage(deep=True))
+            for _, values in obj.items():
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    # Een gefilterde kopie deelt de categorieën met het origineel, alleen de codes zijn eigen
+                    size += values.cat.codes.nbytes
+                    stack.append(values.cat.categories)
+                else:
+                    size += int(values.memory_usage(deep=True, index=False))
+            continue
+        if isinstance(obj, pd.Index):
+            size += int(obj.memory_usage(deep=True))
+            continue
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            stack.append(obj.__dict__)
+    return size
+
+
+def memory_report(all_data):
+    """
+    Geheugengebruik per tabel van een ingelezen export. Objecten die gedeeld worden
+    (dezelfde DataFrame onder twee sleutels, strings in rijen en gebruikers-tuples)
+    tellen één keer, bij de eerste tabel waarin ze voorkomen; 'bereikbaarheid' is
+    dus exclusief het model waar de engine naar verwijst.
+    Returns: DataFrame met Tabel, Rijen, Kolommen, Categorisch en Geheugen (MB)
+    """
+    seen = set()
+    rows = []
+    for key, value in all_data.items():
+        if isinstance(value, pd.DataFrame):
+            gedeeld = id(value) in seen
+            n_categorisch = sum(isinstance(dtype, pd.CategoricalDtype) for dtype in value.dtypes)
+            rows.append((key + (" (gedeeld)" if gedeeld else ""), len(value), value.shape[1], n_categorisch,
+                         _deep_size(value, seen)))
+    model, engine = all_data.get("model"), all_data.get("reachability")
+    if model is not None:
+        n_records = len(model.users_by_number) + len(model.drs_by_ext) + len(model.queues_by_ext) + len(model.ringgroups_by_ext)
+        rows.append(("model", n_records, None, None, _deep_size(model, seen)))
+    if engine is not None:
+        rows.append(("bereikbaarheid", engine.n_paths(), None, None, _deep_size(engine, seen)))
+    for key in ("nummerblok_ranges", "nummerblok_index"):
+        if key in all_data:
+            rows.append((key, len(all_data[key]), None, None, _deep_size(all_data[key], seen)))
+    report = pd.DataFrame(rows, columns=["Tabel", "Rijen", "Kolommen", "Categorisch", "Geheugen (MB)"])
+    report[["Kolommen", "Categorisch"]] = report[["Kolommen", "Categorisch"]].astype("Int64")
+    report["Geheugen (MB)"] = (report["Geheugen (MB)"] / 1e6).round(2)
+    return report
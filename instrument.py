@@ -0,0 +1,151 @@
+"""
+Instrumentatie van de pijplijn: timers per stap, tellers en cache-statistieken.
+
+Een `Trace` verzamelt spans (naam, begin, duur, details) en tellers. Welke trace
+actief is staat in een ContextVar, zodat gelijktijdige Streamlit-sessies elk
+hun eigen trace vullen; voor werk in een thread pool geeft `in_context` de
+context mee. Zonder actieve trace zijn `span`, `timed` en `count` vrijwel
+gratis, dus de aanroepen kunnen in de hot paths blijven staan.
+
+De trace is als JSON te exporteren in het Chrome trace-formaat (te openen in
+chrome://tracing of https://ui.perfetto.dev), met de tellers in `otherData`.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+_current = contextvars.ContextVar("callflow_trace", default=None)
+
+
+class Trace:
+    """Spans en tellers van één run (bv. één rerun van de app of één batch-export)."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans = []     # (naam, begin_s, duur_s, thread_id, details)
+        self.counters = {}  # naam -> aantal
+        self._lock = threading.Lock()
+
+    def add_span(self, name, start, duration, details):
+        self.spans.append((name, start - self.t0, duration, threading.get_ident(), details))
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary_frame(self):
+        """Per stap: aantal, totale en maximale duur in ms, aflopend op totaal."""
+        per_stap = {}
+        for name, _, duration, _, _ in self.spans:
+            aantal, totaal, maximum = per_stap.get(name, (0, 0.0, 0.0))
+            per_stap[name] = (aantal + 1, totaal + duration, max(maximum, duration))
+        rows = [(name, aantal, round(totaal * 1000, 1), round(maximum * 1000, 1))
+                for name, (aantal, totaal, maximum) in per_stap.items()]
+        return (pd.DataFrame(rows, columns=["Stap", "Aantal", "Totaal (ms)", "Max (ms)"])
+                .sort_values("Totaal (ms)", ascending=False, ignore_index=True))
+
+    def cache_stats(self):
+        """
+        Hits en misses uit de tellers `cache.<naam>.hits` / `.misses`; voor caches
+        waarvan alleen aanroepen en misses geteld kunnen worden (st.cache_data)
+        volgen de hits uit `cache.<naam>.calls`.
+        Returns: dict naam -> (hits, misses)
+        """
+        stats = {}
+        for key, value in self.counters.items():
+            parts = key.split(".")
+            if len(parts) < 3 or parts[0] != "cache":
+                continue
+            name, soort = ".".join(parts[1:-1]), parts[-1]
+            hits, misses, calls = stats.get(name, (0, 0, None))
+            if soort == "hits": hits += value
+            elif soort == "misses": misses += value
+            elif soort == "calls": calls = value
+            stats[name] = (hits, misses, calls)
+        return {name: (calls - misses if calls is not None else hits, misses)
+                for name, (hits, misses, calls) in sorted(stats.items())}
+
+    def to_chrome_trace(self, extra=None):
+        """Returns: dict in het Chrome trace-formaat (spans als complete events, in microseconden)."""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": round(start * 1e6, 1), "dur": round(duration * 1e6, 1),
+                   "pid": pid, "tid": tid, "args": details}
+                  for name, start, duration, tid, details in self.spans]
+        other = {"counters": dict(sorted(self.counters.items())),
+                 "caches": {name: {"hits": hits, "misses": misses} for name, (hits, misses) in self.cache_stats().items()}}
+        other.update(extra or {})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": other}
+
+    def to_json(self, extra=None):
+        return json.dumps(self.to_chrome_trace(extra), indent=1, default=str)
+
+
+def activate(trace):
+    """Maakt `trace` (of None: uit) de actieve trace in de huidige context."""
+    _current.set(trace)
+
+
+def active_trace():
+    return _current.get()
+
+
+@contextmanager
+def tracing(trace):
+    """Context manager: `trace` is actief binnen het blok."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, **details):
+    """Timet het blok als stap `name` in de actieve trace (details: extra velden in de JSON)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter() - start, details)
+
+
+def timed(name, details=None):
+    """
+    Decorator: timet elke aanroep als stap `name`.
+    details: optionele functie van de argumenten naar een dict met extra velden.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _current.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                trace.add_span(name, start, time.perf_counter() - start, details(*args, **kwargs) if details else {})
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """Verhoogt teller `name` in de actieve trace."""
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, n)
+
+
+def in_context(func):
+    """Geeft `func` mee aan een thread pool met de huidige trace actief (Context per aanroep)."""
+    return functools.partial(contextvars.copy_context().run, func)
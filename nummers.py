@@ -0,0 +1,243 @@
+"""
+Nummer-normalisatie en nummerblok-index.
+
+`NummerblokIndex` vervangt de lineaire scan over `nummerblok_ranges`: de
+(mogelijk overlappende) ranges worden één keer opgeknipt in elementaire
+segmenten, zodat een lookup een binary search is en een hele kolom in één
+NumPy `searchsorted` pass kan worden toegewezen.
+"""
+import heapq
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+_INT64_MIN, _INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+
+
+def normalize_nl_number(number_str):
+    if pd.isna(number_str) or not isinstance(number_str, str):
+        return None
+
+    cleaned_number = str(number_str).strip() # Start met basis strip
+    cleaned_number = cleaned_number.replace("(0)", "") # Verwijder (0) vroeg
+    cleaned_number = cleaned_number.replace("+", "").replace(" ", "").replace("*", "") # Verwijder andere tekens
+
+    if not cleaned_number: return None
+
+    # Check of het na opschoning nog steeds een valide nummer-achtige string is
+    # (kan beginnen met 00 voor landcode, verder alleen cijfers)
+    if cleaned_number.startswith('00') and cleaned_number[2:].isdigit():
+        # bv 0031... strip 00, wordt 31...
+        # of 0049... strip 00, wordt 49...
+        cleaned_number = cleaned_number[2:]
+    elif not cleaned_number.isdigit():
+        return None # Als het niet alleen cijfers zijn (en ook niet 00... was), dan ongeldig
+
+    # Nu is cleaned_number gegarandeerd een string van cijfers (bv "31..." of "0..." of "6..." of kortere extensie)
+
+    # 1. Heeft al NL landcode (of andere landcode na 00-strip)
+    if cleaned_number.startswith('31') and len(cleaned_number) >= 11: # bv. 31881234567 (11), 31612345678 (11)
+        normalized = cleaned_number
+    # 2. Heeft een leidende 0 (typisch NL formaat)
+    elif cleaned_number.startswith('0') and len(cleaned_number) == 10: # bv. 0881234567, 0612345678
+        normalized = "31" + cleaned_number[1:]
+    # 3. Nationaal nummer zonder 0, maar wel typische lengte (9 cijfers)
+    #    bv. 881234567 (wordt 31881234567) of 612345678 (wordt 31612345678)
+    elif len(cleaned_number) == 9 and cleaned_number[0] != '0': # Eerste cijfer kan niet '0' zijn hier
+        normalized = "31" + cleaned_number
+    # 4. Kortere nummers (extensies), of nummers die niet aan bovenstaande NL-specifieke criteria voldoen
+    else:
+        normalized = cleaned_number # Geef de schoongemaakte cijferreeks (mogelijk extensie) terug
+
+    try:
+        return int(normalized)
+    except (ValueError, TypeError):
+        return None
+
+
+def normalize_nl_numbers(numbers):
+    """
+    Kolomvariant van `normalize_nl_number`: dezelfde regels voor `(0)`, `+`,
+    `00`-prefix en 9/10/11-cijferige nummers, maar met pandas string-methodes
+    en NumPy maskers over een hele Series.
+    Niet-strings en ongeldige waarden worden <NA>, net als nummers van meer dan
+    18 cijfers (die niet gegarandeerd in een Int64 passen).
+    Returns: pd.Series met dtype Int64 en dezelfde index als de invoer.
+    """
+    numbers = pd.Series(numbers)
+    is_str = numbers.map(lambda v: isinstance(v, str)).astype(bool)
+    cleaned = numbers.where(is_str, "").astype(object).astype(str).str.strip()
+    cleaned = cleaned.str.replace("(0)", "", regex=False)
+    cleaned = cleaned.str.replace(r"[+ *]", "", regex=True)
+
+    # 00-landcode prefix strippen als de rest alleen cijfers is
+    strip_00 = cleaned.str.match(r"^00[0-9]+$")
+    cleaned = cleaned.where(~strip_00, cleaned.str.slice(2))
+    valid = is_str & cleaned.str.fullmatch(r"[0-9]+")
+
+    lengths = cleaned.str.len().to_numpy()
+    first = cleaned.str.slice(0, 1).to_numpy()
+    has_31 = cleaned.str.startswith("31").to_numpy() & (lengths >= 11)
+    nat_0 = ~has_31 & (first == "0") & (lengths == 10)
+    nat_9 = ~has_31 & ~nat_0 & (lengths == 9) & (first != "0")
+    normalized = np.select(
+        [nat_0, nat_9],
+        [("31" + cleaned.str.slice(1)).to_numpy(), ("31" + cleaned).to_numpy()],
+        default=cleaned.to_numpy(),
+    )
+    normalized = pd.Series(normalized, index=numbers.index, dtype=object)
+
+    result = pd.Series(pd.NA, index=numbers.index, dtype="Int64")
+    valid &= normalized.str.len() <= 18
+    if valid.any():
+        result[valid] = pd.to_numeric(normalized[valid]).astype("Int64")
+    return result
+
+
+def parse_nummerblok_ranges(trunks_df, start_col, blok_col, end_col='Eindreeks'):
+    """
+    Zet trunksreeksen.csv om naar (start, eind, nummerblok) ranges, kolomsgewijs.
+
+    De eindreeks mag een suffix zijn (bv. 499, korter dan 6 cijfers) dat de
+    laatste cijfers van de start vervangt, een volledig nummer, of leeg (range
+    is dan één nummer). Rijen waarvan start of eind niet te normaliseren is, of
+    waar het eind vóór de start ligt, worden overgeslagen.
+    """
+    df = trunks_df.dropna(subset=[start_col, blok_col])
+    starts = normalize_nl_numbers(df[start_col].astype(str))
+    bloks = df[blok_col].astype(str)
+    if end_col in df.columns:
+        end_raw = df[end_col].astype(str).fillna("nan")  # Zelfde als str(NaN): geen geldig nummer
+    else:
+        end_raw = pd.Series("", index=df.index, dtype=object)
+
+    ends = starts.copy()  # Geen eindreeks: range is enkel nummer
+    is_suffix = end_raw.str.isdigit() & (end_raw.str.len() < 6)
+    is_full = ~is_suffix & (end_raw != "")
+    ends[is_full] = normalize_nl_numbers(end_raw[is_full])
+
+    start_strs = starts.astype(str)
+    for suffix_len in range(1, 6):
+        mask = is_suffix & (end_raw.str.len() == suffix_len) & starts.notna()
+        if mask.any():
+            ends[mask] = normalize_nl_numbers(start_strs[mask].str.slice(0, -suffix_len) + end_raw[mask])
+    ends[is_suffix & starts.isna()] = pd.NA
+
+    valid = starts.notna() & ends.notna()
+    valid &= (ends.fillna(0) >= starts.fillna(0)).astype(bool)
+    return list(zip(starts[valid].astype(int), ends[valid].astype(int), bloks[valid]))
+
+
+def find_nummerblok_for_number(number_str, nummerblok_index):
+    """Zoekt het nummerblok voor een enkel nummer via de interval-index (binary search)."""
+    normalized_num = normalize_nl_number(number_str)
+    if normalized_num is None or not nummerblok_index:
+        return None
+    return nummerblok_index.lookup(normalized_num)
+
+
+class NummerblokIndex:
+    """
+    Interval-index over (start, eind, nummerblok) ranges.
+
+    Bij overlap wint, net als bij de oude lineaire scan, de eerste range in
+    gesorteerde volgorde (laagste start, dan laagste eind, dan bloknaam).
+    """
+
+    def __init__(self, ranges):
+        self.ranges = sorted(ranges)
+        self._bounds, self._bloks = self._build_segments(self.ranges)
+        self._bounds_arr = None
+        if all(_INT64_MIN <= b <= _INT64_MAX for b in self._bounds):
+            self._bounds_arr = np.array(self._bounds, dtype=np.int64)
+        self._bloks_arr = np.array(self._bloks, dtype=object)
+
+    @staticmethod
+    def _build_segments(ranges):
+        """Knipt de ranges op in elementaire segmenten [grens_i, grens_i+1) met elk één winnend blok."""
+        bounds = sorted({start for start, _, _ in ranges} | {end + 1 for _, end, _ in ranges})
+        seg_bounds, seg_bloks = [], []
+        active = []  # heap van (rang, eind); laagste rang = eerste in gesorteerde volgorde
+        next_range = 0
+        for bound in bounds:
+            while next_range < len(ranges) and ranges[next_range][0] <= bound:
+                heapq.heappush(active, (next_range, ranges[next_range][1]))
+                next_range += 1
+            while active and active[0][1] < bound:
+                heapq.heappop(active)  # Lazy verwijderen van afgelopen ranges
+            blok = ranges[active[0][0]][2] if active else None
+            if seg_bloks and seg_bloks[-1] == blok:
+                continue  # Aangrenzende segmenten met hetzelfde blok samenvoegen
+            seg_bounds.append(bound)
+            seg_bloks.append(blok)
+        return seg_bounds, seg_bloks
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __bool__(self):
+        return bool(self.ranges)
+
+    def lookup(self, normalized_num):
+        """Nummerblok voor een genormaliseerd (int) nummer, of None."""
+        if normalized_num is None:
+            return None
+        pos = bisect_right(self._bounds, normalized_num) - 1
+        return self._bloks[pos] if pos >= 0 else None
+
+    def lookup_many(self, normalized_nums):
+        """
+        Nummerblokken voor een reeks genormaliseerde nummers (ints of None/NA).
+        Returns: NumPy object-array met bloknaam of None per positie.
+        """
+        if isinstance(normalized_nums, pd.Series) and normalized_nums.dtype == "Int64":
+            # Snelle route voor de uitvoer van `normalize_nl_numbers`: geen Python-loop
+            fits = normalized_nums.notna().to_numpy()
+            nums = normalized_nums.to_numpy(dtype=np.int64, na_value=0)
+            values = None
+        else:
+            values = [None if v is None or pd.isna(v) else int(v) for v in normalized_nums]
+            fits = np.array([v is not None and _INT64_MIN <= v <= _INT64_MAX for v in values], dtype=bool)
+            nums = np.array([v if ok else 0 for v, ok in zip(values, fits)], dtype=np.int64)
+        result = np.full(len(fits), None, dtype=object)
+        if not self.ranges or len(fits) == 0:
+            return result
+        if self._bounds_arr is None:
+            if values is None:
+                values = [int(v) if ok else None for v, ok in zip(nums, fits)]
+            result[:] = [self.lookup(v) for v in values]
+            return result
+        pos = np.searchsorted(self._bounds_arr, nums, side='right') - 1
+        hit = fits & (pos >= 0)
+        result[hit] = self._bloks_arr[pos[hit]]
+        return result
+
+
+def assign_nummerblokken(users_df, index):
+    """
+    Wijst in één pass nummerblokken toe aan alle gebruikers.
+
+    Returns: tuple van twee lijsten (positioneel uitgelijnd met `users_df`):
+    de gesorteerde, komma-gescheiden DID-blokken en het OutboundCallerID-blok.
+    """
+    n_users = len(users_df)
+    did_blokken = [""] * n_users
+    outbound_blokken = [""] * n_users
+    if not index or n_users == 0:
+        return did_blokken, outbound_blokken
+
+    if 'DID' in users_df.columns:
+        did_parts = users_df['DID'].astype(str).reset_index(drop=True).str.split(':').explode().str.strip()
+        bloks = index.lookup_many(normalize_nl_numbers(did_parts))
+        per_user = {}
+        for pos, blok in zip(did_parts.index, bloks):
+            if blok: per_user.setdefault(pos, set()).add(blok)
+        for pos, bloks_set in per_user.items():
+            did_blokken[pos] = ", ".join(sorted(bloks_set))
+
+    if 'OutboundCallerID' in users_df.columns:
+        outbound = normalize_nl_numbers(users_df['OutboundCallerID'].astype(str))
+        outbound_blokken = [blok if blok else "" for blok in index.lookup_many(outbound)]
+
+    return did_blokken, outbound_blokken
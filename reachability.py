@@ -0,0 +1,484 @@
+"""
+Bereikbaarheid van gebruikers vanuit DR's (tab 2 'Users per Onderdeel' en tab 3 'DRs per User').
+
+Onafhankelijk van Streamlit; voortgang wordt gemeld via een optionele
+`progress(fractie, tekst)` callback.
+"""
+from collections import deque
+from typing import NamedTuple
+
+import pandas as pd
+
+import instrument
+from callgraph import parse_destination
+
+
+def _no_progress(fraction, text=None):
+    pass
+
+
+def _user_tuple(user):
+    """Vaste representatie van een bereikbare gebruiker (rij in tab 2)."""
+    department = user.get('Department', 'Geen Afdeling')
+    if pd.isna(department) or str(department).strip() == "": department = "Geen Afdeling"
+    return (
+        user.get('Number', user.number),
+        user.get('Naam', user.naam),
+        str(department),
+        str(user.get('DID', '')),
+        str(user.get('OutboundCallerID', '')),
+        str(user.get('MobileNumber', '')),
+        str(user.get('EmailAddress', '')),
+        user.nummerblokken_did,
+        user.nummerblok_outbound
+    )
+
+
+def _strongly_connected_components(nodes, successors):
+    """
+    Iteratieve Tarjan: geeft de sterk samenhangende componenten in omgekeerde
+    topologische volgorde (een component komt na alle componenten die hij bereikt).
+    """
+    index, low = {}, {}
+    stack, on_stack = [], set()
+    components = []
+    counter = 0
+    for root in nodes:
+        if root in index: continue
+        index[root] = low[root] = counter; counter += 1
+        stack.append(root); on_stack.add(root)
+        work = [(root, iter(successors[root]))]
+        while work:
+            node, succ_iter = work[-1]
+            for succ in succ_iter:
+                if succ not in index:
+                    index[succ] = low[succ] = counter; counter += 1
+                    stack.append(succ); on_stack.add(succ)
+                    work.append((succ, iter(successors[succ])))
+                    break
+                if succ in on_stack:
+                    low[node] = min(low[node], index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop(); on_stack.discard(member)
+                        component.append(member)
+                        if member == node: break
+                    components.append(component)
+    return components
+
+
+class ReachPath(NamedTuple):
+    """
+    Eén route van een ingang (DR/wachtrij/belgroep) naar een gebruiker.
+    Een tuple i.p.v. een dataclass: er zijn er één per (ingang, gebruiker), dus honderdduizenden.
+    """
+    entry: tuple        # (type, extensie) waar de route begint
+    terminal: tuple     # Knoop die de gebruiker direct bereikt (DR-bestemming of wachtrij/belgroep)
+    path: tuple         # Knopen van entry t/m terminal (kortste route)
+    user: object        # UserRecord
+    member_name: object = None  # Naam in de ledenlijst als de gebruiker lid is van `terminal`
+
+
+class ReachabilityEngine:
+    """
+    Bereikbare gebruikers per DR, wachtrij en belgroep, één keer berekend per upload.
+
+    Knopen zijn ("DR"|"Queue"|"RingGroup", extensie); een wachtrij/belgroep wijst
+    naar zijn leden en zijn no-answer bestemming, een DR naar al zijn bestemmingen.
+    Cycli (DR -> wachtrij -> DR) worden samengevoegd tot sterk samenhangende
+    componenten, die in omgekeerde topologische volgorde worden afgehandeld: elke
+    component erft de (gedeelde) gebruikersset van de componenten die hij bereikt.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._user_tuples = {}  # id(UserRecord) -> (UserRecord, tuple)
+        successors = {}
+        direct_hits = {}  # knoop -> [(UserRecord, lidnaam of None)]; lidnaam als de gebruiker lid is
+        for kind, records in (("Queue", model.queues_by_ext), ("RingGroup", model.ringgroups_by_ext),
+                              ("DR", model.drs_by_ext)):
+            for ext, record in records.items():
+                node = (kind, ext)
+                if kind == "DR":
+                    targets = [self.resolve(dest) for dest in record.parsed_destinations.values()]
+                    hits = []
+                else:
+                    targets = [self.resolve(record.no_answer_parsed)] if pd.notna(record.no_answer_dest) else []
+                    hits = [(member, member_name) for member_name, member in model.group_members(record) if member is not None]
+                successors[node] = []
+                for target in targets:
+                    if target is None: continue
+                    if target[0] == "User":
+                        hits.append((target[1], None))
+                    else:
+                        successors[node].append(target)
+                direct_hits[node] = hits
+
+        self._reach = {}
+        for component in _strongly_connected_components(list(successors), successors):
+            members = set(component)
+            users = set()
+            for node in component:
+                users.update(self._tuple(user) for user, _ in direct_hits[node])
+                for succ in successors[node]:
+                    if succ not in members:
+                        users |= self._reach[succ]
+            users = frozenset(users)
+            for node in component:
+                self._reach[node] = users
+        self.n_nodes = len(successors)
+        self._successors = successors
+        self._predecessors = None  # Omgekeerde graaf, bij de eerste `reaching` opgebouwd
+        self._direct_hits = direct_hits
+        self._paths_by_terminal, self._hits_by_user = self._build_reverse_index(successors, direct_hits)
+
+    @staticmethod
+    def _build_reverse_index(successors, direct_hits):
+        """
+        Omgekeerde index. Per knoop die gebruikers direct bereikt (de 'terminal') zoekt een BFS
+        over de omgekeerde kanten alle knopen die hem bereiken, met het kortste pad. De paden
+        worden per terminal één keer bewaard en per gebruiker alleen de terminals; de ReachPaths
+        zelf bouwt `paths_to_user` pas bij het opvragen (anders één object per ingang en gebruiker).
+        Returns: tuple (terminal -> {ingang: pad}, gebruikersnummer -> [(terminal, UserRecord, lidnaam)])
+        """
+        predecessors = {node: [] for node in successors}
+        for node, succs in successors.items():
+            for succ in succs:
+                predecessors[succ].append(node)
+        paths_by_terminal, hits_by_user = {}, {}
+        for terminal, hits in direct_hits.items():
+            if not hits: continue
+            paths = {terminal: (terminal,)}
+            queue = deque([terminal])
+            while queue:
+                node = queue.popleft()
+                for pred in predecessors[node]:
+                    if pred not in paths:
+                        paths[pred] = (pred,) + paths[node]
+                        queue.append(pred)
+            paths_by_terminal[terminal] = paths
+            for user, member_name in hits:
+                hits_by_user.setdefault(user.number, []).append((terminal, user, member_name))
+        return paths_by_terminal, hits_by_user
+
+    def user_numbers(self):
+        """Nummers van alle gebruikers die via minstens één route bereikbaar zijn."""
+        return self._hits_by_user.keys()
+
+    def n_paths(self):
+        """Aantal routes (ingang, gebruiker) zonder ze op te bouwen."""
+        return sum(len(self._paths_by_terminal[terminal]) for hits in self._hits_by_user.values() for terminal, _, _ in hits)
+
+    def paths_to_user(self, number):
+        """Alle ReachPaths (vanaf elke DR, wachtrij en belgroep) naar de gebruiker met dit nummer."""
+        return [ReachPath(entry, terminal, path, user, member_name)
+                for terminal, user, member_name in self._hits_by_user.get(str(number), ())
+                for entry, path in self._paths_by_terminal[terminal].items()]
+
+    def node_label(self, node):
+        """Leesbare naam van een knoop, bv. 'Sales Q (8020)'."""
+        kind, ext = node
+        record = self.model.dr(ext) if kind == "DR" else self.model.queue(ext) if kind == "Queue" else self.model.ringgroup(ext)
+        return f"{record.name} ({ext})"
+
+    def _tuple(self, user):
+        # Het record wordt bij de tuple bewaard: na unpicklen van een snapshot kan een
+        # id() van een ander object zijn, de identiteitscheck vangt dat af
+        entry = self._user_tuples.get(id(user))
+        if entry is None or entry[0] is not user:
+            entry = self._user_tuples[id(user)] = (user, _user_tuple(user))
+        return entry[1]
+
+    def reaching(self, nodes):
+        """Alle knopen van waaruit een van `nodes` bereikt wordt, inclusief die knopen zelf (omgekeerde BFS)."""
+        predecessors = self._predecessors
+        if predecessors is None:  # Eerst volledig opbouwen, dan pas delen: de engine kan tussen sessies gedeeld zijn
+            predecessors = {}
+            for node, succs in self._successors.items():
+                for succ in succs:
+                    predecessors.setdefault(succ, []).append(node)
+            self._predecessors = predecessors
+        seen = {node for node in nodes if node in self._successors}
+        queue = deque(seen)
+        while queue:
+            for pred in predecessors.get(queue.popleft(), ()):
+                if pred not in seen:
+                    seen.add(pred)
+                    queue.append(pred)
+        return seen
+
+    def share_user_tuples(self, canonical):
+        """
+        Vervangt de gebruikers-tuples door de exemplaren die `canonical(tuple)` teruggeeft
+        (zie workspace.share_across); sets die binnen een component gedeeld werden blijven gedeeld.
+        """
+        for key, (user, user_tuple) in self._user_tuples.items():
+            self._user_tuples[key] = (user, canonical(user_tuple))
+        rebuilt = {}
+        for node, users in self._reach.items():
+            if id(users) not in rebuilt:  # Oude set blijft in `rebuilt` leven, dus het id blijft uniek
+                rebuilt[id(users)] = (users, frozenset(map(canonical, users)))
+            self._reach[node] = rebuilt[id(users)][1]
+
+    def resolve(self, dest_key):
+        """
+        Vertaalt een geparste bestemming (type, id) naar een knoop, met dezelfde
+        voorrang als de flows: gebruiker, dan wachtrij, dan belgroep, dan DR.
+        Returns: ("User", UserRecord), (type, extensie) of None
+        """
+        dest_type, dest_id = dest_key
+        if not dest_type: return None
+        model = self.model
+        if dest_type in ("User", "ExtensionNumber", "UnknownType"):
+            user = model.user(dest_id)
+            if user is not None: return "User", user
+        if dest_type in ("Queue", "ExtensionNumber") and model.queue(dest_id) is not None:
+            return "Queue", str(dest_id)
+        if dest_type in ("RingGroup", "ExtensionNumber") and model.ringgroup(dest_id) is not None:
+            return "RingGroup", str(dest_id)
+        if dest_type in ("DR", "ExtensionNumber") and model.dr(dest_id) is not None:
+            return "DR", str(dest_id)
+        return None
+
+    def reachable_users(self, node):
+        """Gebruikers-tuples bereikbaar vanuit een knoop uit `resolve`."""
+        if node is None: return frozenset()
+        if node[0] == "User": return frozenset([self._tuple(node[1])])
+        return self._reach.get(node, frozenset())
+
+    def traverse(self, dest_keys, on_node=None, max_depth=None):
+        """
+        Generator: BFS (deque) vanaf geparste bestemmingen die elke gebruiker
+        yieldt zodra die ontdekt wordt, als (UserRecord, pad, diepte). Het pad
+        bevat de doorlopen knopen; diepte is de lengte daarvan (0 = de
+        bestemming is zelf een gebruiker).
+        `on_node(knoop, diepte)` wordt per verwerkte knoop aangeroepen; geeft die
+        False terug, dan wordt de knoop overgeslagen. Stoppen met itereren breekt
+        de traversal direct af.
+        """
+        frontier = deque()
+        seen_nodes, seen_users = set(), set()
+        for dest_key in dest_keys:
+            node = self.resolve(dest_key)
+            if node is None: continue
+            if node[0] == "User":
+                if id(node[1]) not in seen_users:
+                    seen_users.add(id(node[1]))
+                    yield node[1], (), 0
+            elif node not in seen_nodes:
+                seen_nodes.add(node)
+                frontier.append((node, (node,)))
+        while frontier:
+            node, path = frontier.popleft()
+            if on_node is not None and on_node(node, len(path)) is False: continue
+            for user, _ in self._direct_hits[node]:
+                if id(user) not in seen_users:
+                    seen_users.add(id(user))
+                    yield user, path, len(path)
+            if max_depth is not None and len(path) >= max_depth: continue
+            for succ in self._successors[node]:
+                if succ not in seen_nodes:
+                    seen_nodes.add(succ)
+                    frontier.append((succ, path + (succ,)))
+
+    def is_reachable(self, user_number, dest_keys):
+        """Of de gebruiker bereikbaar is vanuit de bestemmingen; stopt bij de eerste treffer."""
+        user_number = str(user_number)
+        return any(user.number == user_number for user, _, _ in self.traverse(dest_keys))
+
+    def users_reachable_from(self, dest_keys):
+        """Vereniging van de bereikbare gebruikers vanuit meerdere geparste bestemmingen."""
+        users = set()
+        for dest_key in dest_keys:
+            users |= self.reachable_users(self.resolve(dest_key))
+        return users
+
+
+def iter_reachable_users(start_destination_strings, all_data, on_node=None, max_depth=None):
+    """Streaming variant van `find_reachable_users`, zie `ReachabilityEngine.traverse`."""
+    return all_data["reachability"].traverse(
+        (parse_destination(dest_str) for dest_str in start_destination_strings), on_node=on_node, max_depth=max_depth)
+
+
+@instrument.timed("find_reachable_users")
+def find_reachable_users(start_destination_strings, all_data):
+    """
+    Alle gebruikers bereikbaar vanuit de start-bestemmingen, direct of via
+    wachtrijen, belgroepen en (geneste) DR's.
+    Returns: set van tuples (nummer, naam, afdeling, DID, CID, mobiel, e-mail, nummerblokken DID, nummerblok CID)
+    """
+    return all_data["reachability"].users_reachable_from(
+        parse_destination(dest_str) for dest_str in start_destination_strings)
+
+
+@instrument.timed("build_users_per_onderdeel")
+def build_users_per_onderdeel(all_data, progress=None):
+    """
+    Bouwt de tabel 'Users per Onderdeel': alle gebruikers die bereikbaar zijn vanuit de DR's
+    van elk geldig Onderdeel. Onderdelen zonder bereikbare gebruikers krijgen een placeholder-regel.
+    Returns: DataFrame gesorteerd op Onderdeel en User Name
+    """
+    engine = all_data["reachability"]
+    # Verzamel data initieel
+    users_per_onderdeel_data = []
+    # Alleen geldige onderdelen, met de DR-records uit het model (bestemmingen al geparst)
+    drs_per_onderdeel = engine.model.drs_per_onderdeel()
+
+    if progress is None: progress = _no_progress
+    total_onderdelen_met_drs = len(drs_per_onderdeel)
+
+    # Loop over onderdelen die DRs hebben
+    for i, (onderdeel, drs) in enumerate(drs_per_onderdeel.items()):
+        # Elke rij telt, ook een tweede rij met dezelfde extensie
+        reachable_users_tuples = engine.users_reachable_from(
+            dest_key for dr in drs for dest_key in dr.parsed_destinations.values())
+
+        for user_num, user_name, user_dep, did_str, cid, mobile, email, did_blokken_str, outbound_blok_str in reachable_users_tuples:
+             users_per_onderdeel_data.append({
+                 "Onderdeel": onderdeel,
+                 "User Number": user_num,
+                 "User Name": user_name,
+                 "Department": user_dep,
+                 "DID": did_str,
+                 "Outbound CID": cid,
+                 "Mobile": mobile,
+                 "Email": email,
+                 "Nummerblok(ken) DID": did_blokken_str,
+                 "Nummerblok OutboundCID": outbound_blok_str
+             })
+        progress((i + 1) / total_onderdelen_met_drs, f"Onderdeel {i+1}/{total_onderdelen_met_drs}")
+
+    # Initialiseer DataFrame *voor* de check, met de juiste kolommen
+    users_per_onderdeel_df = pd.DataFrame(columns=[
+        "Onderdeel", "User Number", "User Name", "Department", "DID", 
+        "Outbound CID", "Mobile", "Email", "Nummerblok(ken) DID", "Nummerblok OutboundCID"
+    ])
+
+    # Bouw DataFrame als er data is
+    if users_per_onderdeel_data:
+         # Overschrijf de lege DataFrame met de gevonden data
+         users_per_onderdeel_df = pd.DataFrame(users_per_onderdeel_data)
+    # De else-tak is niet meer nodig, users_per_onderdeel_df is al leeg geïnitialiseerd.
+
+    # --- Voeg ontbrekende onderdelen toe --- 
+    # Gebruik de lijst van *alle* geldige onderdelen die eerder is bepaald
+    # users_per_onderdeel_df bestaat nu gegarandeerd.
+    onderdelen_in_df = set(users_per_onderdeel_df['Onderdeel'].unique())
+    missing_onderdelen = set(drs_per_onderdeel) - onderdelen_in_df
+
+    if missing_onderdelen:
+         placeholder_data = []
+         for missing_ond in missing_onderdelen:
+              placeholder_data.append({
+                  "Onderdeel": missing_ond,
+                  "User Number": "", "User Name": "(Geen bereikbare users)", "Department": "", 
+                  "DID": "", "Outbound CID": "", "Mobile": "", "Email": "",
+                  "Nummerblok(ken) DID": "", "Nummerblok OutboundCID": ""
+              })
+         missing_df = pd.DataFrame(placeholder_data)
+         users_per_onderdeel_df = pd.concat([users_per_onderdeel_df, missing_df], ignore_index=True)
+    # --- Einde toevoegen --- 
+
+    # Zorg dat kolommen string zijn en sorteer
+    users_per_onderdeel_df['Department'] = users_per_onderdeel_df['Department'].astype(str)
+    users_per_onderdeel_df['Nummerblok(ken) DID'] = users_per_onderdeel_df['Nummerblok(ken) DID'].astype(str)
+    users_per_onderdeel_df['Nummerblok OutboundCID'] = users_per_onderdeel_df['Nummerblok OutboundCID'].astype(str)
+    users_per_onderdeel_df['Email'] = users_per_onderdeel_df['Email'].astype(str)
+    # Sorteer de *complete* dataframe
+    users_per_onderdeel_df = users_per_onderdeel_df.sort_values(by=["Onderdeel", "User Name"])
+    return users_per_onderdeel_df
+
+
+@instrument.timed("build_user_reachability_data")
+def build_user_reachability_data(all_data, progress=None):
+    """
+    Bepaalt per DR welke gebruikers bereikt worden, over alle niveaus (geneste DR's en
+    no-answer bestemmingen), uit de omgekeerde index van de ReachabilityEngine.
+    'Reached Via' is de laatste stap (de DR-bestemming of wachtrij/belgroep), 'Via Pad'
+    de kortste route vanaf de DR.
+    `progress(fractie, tekst)` wordt per verwerkte gebruiker aangeroepen.
+    Returns: DataFrame met één regel per (gebruiker, bereikt-via, pad, onderdeel)
+    """
+    results = []
+    model = all_data["model"]
+    engine = all_data["reachability"]
+    receptionists_data = all_data.get("receptionists_all", pd.DataFrame())
+
+    # Helper functie binnen build_user_reachability_data, correct ge-indent
+    def result_row(user_info, user_number, user_name, via_type, via_name, via_ext, via_path, onderdeel_naam):
+        department = user_info.get('Department', 'Geen Afdeling')
+        if pd.isna(department) or str(department).strip() == "": department = "Geen Afdeling"
+        return {
+            "User Number": user_number,
+            "User Name": user_name,
+            "User Department": str(department),
+            "Mobile": str(user_info.get('MobileNumber', '')),
+            "Email": str(user_info.get('EmailAddress', '')),
+            "DID": str(user_info.get('DID', '')),
+            "Outbound CID": str(user_info.get('OutboundCallerID', '')),
+            "Reached Via Type": via_type,
+            "Reached Via Name": via_name,
+            "Reached Via Ext": via_ext,
+            "Via Pad": via_path,
+            "Onderdeel": onderdeel_naam,
+            "Nummerblok(ken) DID": user_info.nummerblokken_did, 
+            "Nummerblok OutboundCID": user_info.nummerblok_outbound 
+        }
+    # Einde helper
+
+    if progress is None: progress = _no_progress
+    progress(0, "Analyseren van DR-bestemmingen...")
+
+    # Ingangen van de tabel zijn de DR-rijen; meerdere rijen kunnen dezelfde extensie hebben
+    dr_rows_by_node = {}
+    for dr in receptionists_data.to_dict('records'):
+        dr_ext = str(dr.get("Virtual Extension Number", "N/A"))
+        dr_rows_by_node.setdefault(("DR", dr_ext), []).append(
+            (dr.get('Onderdeel', 'Onbekend Onderdeel'), dr.get("Digital Receptionist Name", "Naamloos"), dr_ext))
+
+    total_users = len(engine.user_numbers())
+    last_percent = -1
+    for i, number in enumerate(engine.user_numbers()):
+        for reach in engine.paths_to_user(number):
+            for onderdeel_naam, dr_name, dr_ext in dr_rows_by_node.get(reach.entry, []):
+                user = reach.user
+                # Direct als DR-bestemming (of no-answer bestemming) of als lid van een wachtrij/belgroep
+                if reach.member_name is None:
+                    user_number, user_name = user.number, user.get('Naam', f'User {user.number}')
+                else:
+                    user_number, user_name = user.get('Number', 'N/A'), reach.member_name
+                terminal_type, terminal_ext = reach.terminal
+                if terminal_type == "DR":
+                    via_name = dr_name if reach.terminal == reach.entry else model.dr(terminal_ext).name
+                    via = ("DR", via_name, terminal_ext)
+                else:
+                    group = model.queue(terminal_ext) if terminal_type == "Queue" else model.ringgroup(terminal_ext)
+                    via = (group.group_type, group.name, group.ext)
+                via_path = " → ".join(engine.node_label(node) for node in reach.path)
+                results.append(result_row(user, user_number, user_name, *via, via_path, onderdeel_naam))
+        percent = (i + 1) * 100 // total_users  # Alleen bij een heel procent: elke update is een st.progress-bericht
+        if percent != last_percent:
+            last_percent = percent
+            progress((i + 1) / total_users, f"Analyseren gebruiker {i+1}/{total_users}...")
+
+    if not results:
+        # Return empty DataFrame with ALL columns specified
+        return pd.DataFrame(columns=[
+             "User Name", "User Number", "User Department", "Mobile", "Email", "DID", "Outbound CID",
+             "Reached Via Type", "Reached Via Name", "Reached Via Ext", "Via Pad", "Onderdeel",
+             "Nummerblok(ken) DID", "Nummerblok OutboundCID"
+        ])
+
+    df = pd.DataFrame(results)
+    # Ensure all relevant columns are string type before sorting/dropping duplicates
+    for col in ["User Department", "Mobile", "Email", "DID", "Outbound CID", "Nummerblok(ken) DID", "Nummerblok OutboundCID"]:
+         if col in df.columns: # Check if column exists before conversion
+              df[col] = df[col].astype(str)
+    df = df.drop_duplicates().sort_values(by=["User Name", "Onderdeel", "Reached Via Type", "Reached Via Name"])
+    return df
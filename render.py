@@ -0,0 +1,82 @@
+"""
+Server-side rendering van DOT naar SVG met een content-addressed schijfcache.
+
+Een SVG wordt opgeslagen onder de SHA-256 van (engine, format, DOT-bron), dus
+een ongewijzigde flow wordt nooit opnieuw gelayout, ook niet na een herstart
+van de server. De cache is begrensd in bytes; bij overschrijding worden de
+minst recent gebruikte bestanden (mtime, bijgewerkt bij elke hit) verwijderd.
+Renderen gebeurt in een thread pool: het eigenlijke werk zit in het `dot`
+subprocess, dus threads zijn voldoende en er hoeft niets gepickled te worden.
+"""
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import graphviz
+
+import instrument
+from diskcache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "CALLFLOW_RENDER_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "3cx_callflow", "svg"))
+DEFAULT_MAX_BYTES = int(os.environ.get("CALLFLOW_RENDER_CACHE_MB", "256")) * 1024 * 1024
+
+
+class RenderCache(DiskCache):
+    """Rendercache geadresseerd op de hash van de DOT-bron."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(directory, max_bytes)
+
+    @staticmethod
+    def key(dot_source, engine='dot', fmt='svg'):
+        digest = hashlib.sha256(f"{engine}\0{fmt}\0".encode('utf-8'))
+        digest.update(dot_source.encode('utf-8'))
+        return digest.hexdigest()
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = RenderCache()
+    return _default_cache
+
+
+def render_svg(dot_source, engine='dot', cache=None):
+    """
+    Rendert DOT-bron naar SVG (bytes), via de schijfcache.
+    Gooit graphviz.ExecutableNotFound als Graphviz niet geïnstalleerd is.
+    """
+    if cache is None: cache = default_cache()
+    key = cache.key(dot_source, engine, 'svg')
+    svg = cache.get(key, 'svg')
+    if svg is None:
+        instrument.count("cache.render.misses")
+        with instrument.span("render_svg", bytes_dot=len(dot_source)):
+            svg = graphviz.Source(dot_source, engine=engine).pipe(format='svg')
+        try:
+            cache.put(key, svg, 'svg')
+        except OSError as e:  # Volle of alleen-lezen cachemap: de render zelf is wel gelukt
+            logger.warning("SVG kon niet in de cache worden opgeslagen: %s", e)
+    else:
+        instrument.count("cache.render.hits")
+    return svg
+
+
+def render_many(dot_sources, workers=None, cache=None):
+    """
+    Start het renderen van meerdere DOT-bronnen parallel.
+    Returns: lijst van futures (zelfde volgorde als `dot_sources`) met SVG-bytes als resultaat.
+    """
+    if cache is None: cache = default_cache()
+    pool = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1))
+    try:
+        return [pool.submit(instrument.in_context(render_svg), source, 'dot', cache) for source in dot_sources]
+    finally:
+        pool.shutdown(wait=False)  # Lopende renders gaan door; futures blijven bruikbaar
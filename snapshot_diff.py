@@ -0,0 +1,219 @@
+"""
+Verschil tussen twee exports (bv. die van vorige en deze week), op basis van de
+uitvoer van `load_data_from_zip`.
+
+Gebruikers, DR's, wachtrijen en belgroepen worden per sleutel (nummer of
+extensie) vergeleken via een hash van hun inhoud, dus lineair in het aantal
+records. Met de omgekeerde graaf van beide bereikbaarheids-engines wordt daarna
+bepaald welke flows een gewijzigd record raken (alleen die hoeven opnieuw
+gerenderd te worden) en welke resultaten van tab 2 en 3 echt veranderd zijn.
+"""
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+import instrument
+from callgraph import split_receptionists_by_onderdeel
+from flows import build_onderdeel_flow, build_individual_flow, individual_flow_context
+
+RECORD_KINDS = ("User", "DR", "Queue", "RingGroup")
+
+
+@dataclass
+class SnapshotDiff:
+    """Uitkomst van `diff_snapshots`; sleutels van records en knopen zijn strings."""
+    added: dict = field(default_factory=dict)    # soort -> [sleutel]
+    removed: dict = field(default_factory=dict)  # soort -> [sleutel]
+    changed: dict = field(default_factory=dict)  # soort -> [sleutel]
+    highlight: set = field(default_factory=set)  # (soort, sleutel) die in de nieuwe flows gemarkeerd worden
+    flows: dict = field(default_factory=dict)    # ('Onderdeel', naam) | ('IVR', ext) -> 'nieuw' | 'verwijderd' | 'gewijzigd'
+    onderdelen: dict = field(default_factory=dict)  # onderdeel -> (nieuw bereikbare nummers, niet meer bereikbare nummers)
+    users: list = field(default_factory=list)    # nummers waarvan de rijen in tab 3 veranderd zijn
+
+    def __bool__(self):
+        return any(self.added.values()) or any(self.removed.values()) or any(self.changed.values())
+
+    def records_frame(self):
+        """Alle record-wijzigingen als tabel (Soort, Sleutel, Wijziging)."""
+        rows = [(kind, key, wijziging)
+                for wijziging, per_kind in (("Nieuw", self.added), ("Verwijderd", self.removed), ("Gewijzigd", self.changed))
+                for kind in RECORD_KINDS for key in per_kind.get(kind, [])]
+        return pd.DataFrame(rows, columns=["Soort", "Sleutel", "Wijziging"])
+
+    def onderdelen_frame(self):
+        """Per Onderdeel de gebruikers die in tab 2 bij- of afgekomen zijn."""
+        rows = [(onderdeel, ", ".join(nieuw), ", ".join(weg)) for onderdeel, (nieuw, weg) in sorted(self.onderdelen.items())]
+        return pd.DataFrame(rows, columns=["Onderdeel", "Nieuw bereikbaar", "Niet meer bereikbaar"])
+
+
+def _row_hashes(df, key_column):
+    """
+    Sleutel -> hash over álle rijen met die sleutel: het model houdt alleen de eerste,
+    maar tab 2 en 3 tellen elke DR-rij (met eigen Onderdeel en naam) als ingang en een
+    dubbel gebruikersnummer bepaalt welke naam bij welk nummer hoort.
+    """
+    if df is None or key_column not in df.columns:
+        return {}
+    by_key = {}
+    key_pos = list(df.columns).index(key_column)
+    for row in df.itertuples(index=False, name=None):
+        by_key.setdefault(str(row[key_pos]), []).append(tuple(map(str, row)))  # str(): NaN-objecten zijn niet gelijk
+    columns = tuple(df.columns)
+    # Volgorde van de rijen telt niet, alleen de inhoud
+    return {key: hash((columns, tuple(sorted(key_rows)))) for key, key_rows in by_key.items()}
+
+
+def _items(row):
+    """Inhoud van een rij als hashbare tuple; str(): de hash van een NaN hangt af van het object, dus niet stabiel na pickle."""
+    return tuple((col, str(value)) for col, value in row.items())
+
+
+def _record_hashes(all_data):
+    """Per soort: sleutel -> hash van de inhoud (volledige rij(en) plus afgeleide velden)."""
+    model = all_data["model"]
+    user_rows = _row_hashes(all_data.get("users"), 'Number')
+    return {
+        "User": {number: hash((user_rows.get(number), _items(user.row), user.nummerblokken_did, user.nummerblok_outbound))
+                 for number, user in model.users_by_number.items()},
+        "DR": _row_hashes(all_data.get("receptionists_all"), 'Virtual Extension Number'),
+        "Queue": {ext: hash(_items(group.row)) for ext, group in model.queues_by_ext.items()},
+        "RingGroup": {ext: hash(_items(group.row)) for ext, group in model.ringgroups_by_ext.items()},
+    }
+
+
+def flow_starts(all_data):
+    """
+    De flows zoals tab 1 ze toont, met de DR's waar ze starten.
+    Returns: dict ('Onderdeel', naam) | ('IVR', ext) -> frozenset van DR-extensies
+    """
+    receptionists = all_data.get("receptionists_all")
+    if receptionists is None or receptionists.empty or 'Onderdeel' not in receptionists.columns:
+        return {}
+    drs_met_geldig_onderdeel, drs_zonder_geldig_onderdeel, _ = split_receptionists_by_onderdeel(receptionists)
+    flows = {}
+    for onderdeel_naam, groep in drs_met_geldig_onderdeel.groupby('Onderdeel'):
+        primair = groep[groep['Primair/Secundair'] == 'Primair'] if 'Primair/Secundair' in groep.columns else groep.iloc[0:0]
+        start = groep if primair.empty else primair
+        flows[("Onderdeel", onderdeel_naam)] = frozenset(start['Virtual Extension Number'].dropna().astype(str))
+    for _, dr in drs_zonder_geldig_onderdeel.iterrows():
+        context = individual_flow_context(dr)
+        if context is not None:
+            flows[("IVR", context[1])] = frozenset([context[1]])
+    return flows
+
+
+def _onderdeel_reach(all_data):
+    """Onderdeel -> bereikbare gebruikers-tuples vanuit alle DR's van dat onderdeel (zoals tab 2)."""
+    engine = all_data["reachability"]
+    # Elke rij telt, ook een tweede rij met dezelfde extensie (zoals in `build_users_per_onderdeel`)
+    return {onderdeel_naam: engine.users_reachable_from(dest_key for dr in drs for dest_key in dr.parsed_destinations.values())
+            for onderdeel_naam, drs in engine.model.drs_per_onderdeel().items()}
+
+
+def _route_key(engine, number, dr_hashes):
+    """
+    Wat tab 3 van een gebruiker toont: per route vanaf een DR de inhoud van de DR-rij(en),
+    de namen op het pad en de ledennaam. Routes vanaf een wachtrij of belgroep geven geen rij.
+    """
+    return frozenset((dr_hashes.get(path.entry[1]), tuple(engine.node_label(node) for node in path.path), path.member_name)
+                     for path in engine.paths_to_user(number) if path.entry[0] == "DR")
+
+
+@instrument.timed("diff_snapshots")
+def diff_snapshots(old_data, new_data):
+    """
+    Vergelijkt twee ingelezen exports.
+    Returns: SnapshotDiff met de record-wijzigingen, de gewijzigde flows en de
+    veranderde bereikbaarheid (tab 2 per Onderdeel, tab 3 per gebruiker).
+    """
+    old_model, new_model = old_data["model"], new_data["model"]
+    old_engine, new_engine = old_data["reachability"], new_data["reachability"]
+    diff = SnapshotDiff()
+
+    old_hashes, new_hashes = _record_hashes(old_data), _record_hashes(new_data)
+    for kind in RECORD_KINDS:
+        old, new = old_hashes[kind], new_hashes[kind]
+        diff.added[kind] = sorted(key for key in new if key not in old)
+        diff.removed[kind] = sorted(key for key in old if key not in new)
+        diff.changed[kind] = sorted(key for key, digest in new.items() if key in old and old[key] != digest)
+
+    changed_users = set(diff.added["User"]) | set(diff.removed["User"]) | set(diff.changed["User"])
+    changed_nodes = {(kind, key) for kind in ("DR", "Queue", "RingGroup")
+                     for key in diff.added[kind] + diff.removed[kind] + diff.changed[kind]}
+
+    # Gemarkeerd in de nieuwe flows: nieuwe/gewijzigde records, plus groepen waarvan het label
+    # (de ledenlijst met gebruikersgegevens) door een gewijzigde gebruiker anders is
+    diff.highlight = {(kind, key) for kind in RECORD_KINDS for key in diff.added[kind] + diff.changed[kind]}
+    for number in changed_users:
+        diff.highlight.update(new_model.groups_of_user(number))
+
+    # DR's vanwaar een gewijzigde knoop of gebruiker bereikt wordt, in de oude of de nieuwe graaf
+    affected = set()
+    for model, engine in ((old_model, old_engine), (new_model, new_engine)):
+        affected |= engine.reaching(changed_nodes)
+        for number in changed_users:
+            affected.update(path.entry for path in engine.paths_to_user(number))
+        for ext, dr in model.drs_by_ext.items():  # Voicemail-labels tonen de naam van de gebruiker
+            if any(dest_type == "Voicemail" and str(dest_id) in changed_users
+                   for dest_type, dest_id in dr.parsed_destinations.values()):
+                affected.add(("DR", ext))
+
+    old_flows, new_flows = flow_starts(old_data), flow_starts(new_data)
+    for key in sorted(old_flows.keys() | new_flows.keys(), key=str):
+        if key not in old_flows:
+            diff.flows[key] = "nieuw"
+        elif key not in new_flows:
+            diff.flows[key] = "verwijderd"
+        elif old_flows[key] != new_flows[key] or any(("DR", ext) in affected for ext in old_flows[key] | new_flows[key]):
+            diff.flows[key] = "gewijzigd"
+
+    old_reach, new_reach = _onderdeel_reach(old_data), _onderdeel_reach(new_data)
+    for onderdeel in old_reach.keys() | new_reach.keys():
+        old_users, new_users = old_reach.get(onderdeel, frozenset()), new_reach.get(onderdeel, frozenset())
+        if old_users != new_users:
+            old_numbers, new_numbers = {user[0] for user in old_users}, {user[0] for user in new_users}
+            diff.onderdelen[onderdeel] = (sorted(new_numbers - old_numbers), sorted(old_numbers - new_numbers))
+
+    # Tab 3 kan alleen veranderen voor gewijzigde gebruikers en gebruikers stroomafwaarts van een gewijzigde knoop
+    candidates = set(changed_users)
+    for engine in (old_engine, new_engine):
+        for node in changed_nodes:
+            candidates.update(user[0] for user in engine.reachable_users(node))
+    diff.users = sorted(number for number in candidates
+                        if _route_key(old_engine, number, old_hashes["DR"]) != _route_key(new_engine, number, new_hashes["DR"])
+                        or number in changed_users and (old_engine.paths_to_user(number) or new_engine.paths_to_user(number)))
+    return diff
+
+
+def diff_flow_sources(new_data):
+    """
+    De DR-rijen waaruit de flows van de nieuwe export gebouwd worden; één keer te bepalen voor alle flows.
+    Returns: (Onderdeel -> DataFrame met de DR's, IVR-extensie -> DR-rij)
+    """
+    receptionists = new_data.get("receptionists_all", pd.DataFrame())
+    drs_met_geldig_onderdeel, drs_zonder_geldig_onderdeel, _ = split_receptionists_by_onderdeel(receptionists)
+    onderdelen = dict(iter(drs_met_geldig_onderdeel.groupby('Onderdeel')))
+    individuele_drs = {}
+    for _, dr in drs_zonder_geldig_onderdeel.iterrows():
+        context = individual_flow_context(dr)
+        if context is not None:
+            individuele_drs.setdefault(context[1], dr)
+    return onderdelen, individuele_drs
+
+
+def build_diff_flows(flow_keys, new_data, diff, sources=None):
+    """
+    Bouwt de opgegeven flows uit de nieuwe export, met de knopen uit `diff.highlight` gemarkeerd.
+    sources: uitkomst van `diff_flow_sources(new_data)`, als die al bepaald is
+    Returns: lijst van (flow-sleutel, Flow)
+    """
+    marked_data = dict(new_data, highlight_nodes=diff.highlight)
+    onderdelen, individuele_drs = sources if sources is not None else diff_flow_sources(new_data)
+    flows = []
+    for key in flow_keys:
+        kind, naam = key
+        if kind == "Onderdeel" and naam in onderdelen:
+            flows.append((key, build_onderdeel_flow(naam, onderdelen[naam], marked_data)))
+        elif kind == "IVR" and naam in individuele_drs:
+            flows.append((key, build_individual_flow(individuele_drs[naam], marked_data)))
+    return flows
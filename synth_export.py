@@ -0,0 +1,202 @@
+"""
+Synthetische 3CX-exports voor benchmarks en het uitproberen van de app zonder
+echte (vertrouwelijke) data.
+
+Genereert een ZIP met `Receptionists.csv`, `Queues.csv`, `ringgroups.csv`,
+`Users.csv` en `trunksreeksen.csv` in het formaat van een echte export
+(puntkomma, Nederlandse bestemmingen zoals `Wachtrij(8001 Sales)`). De vorm is
+instelbaar: per Onderdeel een boom van geneste DR's, een deel van de DR's dat
+terugverwijst naar een bovenliggende DR (cycli), grote wachtrijen en veel
+nummerblokken met DID's verspreid over de gebruikers.
+
+Gebruik:
+    python synth_export.py -o export.zip [--scale 10] [--seed 1] [--depth 3] [--cycles 0.1]
+"""
+import argparse
+import io
+import random
+import sys
+import zipfile
+from dataclasses import dataclass
+
+# Aantallen bij schaal 1; alles schaalt lineair mee
+BASE_USERS = 100
+BASE_ONDERDELEN = 4
+BASE_QUEUES = 8
+BASE_RINGGROUPS = 6
+BASE_NUMMERBLOKKEN = 10
+
+DEPARTMENTS = ["Verkoop", "Inkoop", "Service", "ICT", "Financiën", "HR", "Logistiek", "Directie"]
+FIRST_NAMES = ["Anna", "Bram", "Carla", "Daan", "Eva", "Finn", "Gijs", "Hanna", "Iris", "Joris", "Kim", "Lars",
+               "Mila", "Noah", "Olga", "Pim", "Roos", "Sem", "Tess", "Vera"]
+LAST_NAMES = ["de Vries", "Jansen", "Bakker", "Visser", "Smit", "Meijer", "de Boer", "Mulder", "Bos", "Vos",
+              "Peters", "Hendriks", "van Dijk", "Dekker", "Brouwer"]
+
+DR_COLUMNS = (["Onderdeel", "Primair/Secundair", "Digital Receptionist Name", "Virtual Extension Number"]
+              + [f"Menu {i}" for i in range(10)]
+              + ["When office is closed route to", "When on break route to", "When on holiday route to",
+                 "Send call to", "Invalid input destination", "If no input within seconds"])
+
+
+@dataclass
+class ExportShape:
+    """Vorm van een synthetische export; `scale` vermenigvuldigt alle aantallen."""
+    scale: float = 1
+    depth: int = 3            # Niveaus geneste DR's onder de primaire DR van een Onderdeel
+    fanout: int = 3           # Sub-DR's per DR-menu (tot `depth` bereikt is)
+    cycles: float = 0.1       # Fractie DR's met een menu-optie terug naar de bovenliggende DR
+    queue_size: int = 25      # Leden per wachtrij (User 1 .. User n)
+    ringgroup_size: int = 8   # Leden per belgroep
+    dids_per_user: int = 2    # Maximaal aantal DID's per gebruiker (':'-gescheiden)
+    individual_drs: float = 0.1  # Fractie DR's zonder geldig Onderdeel (eigen flow in tab 1)
+
+    def count(self, base):
+        return max(1, int(round(base * self.scale)))
+
+
+def _csv(columns, rows):
+    return "\n".join([";".join(columns)] + [";".join("" if value is None else str(value) for value in row)
+                                           for row in rows]) + "\n"
+
+
+def generate_export(shape=None, seed=0):
+    """
+    Genereert een synthetische export.
+    Returns: tuple (zip_bytes, dict met de aantallen per soort record)
+    """
+    shape = shape or ExportShape()
+    r = random.Random(seed)
+    n_users, n_onderdelen = shape.count(BASE_USERS), shape.count(BASE_ONDERDELEN)
+    n_queues, n_ringgroups = shape.count(BASE_QUEUES), shape.count(BASE_RINGGROUPS)
+    n_blokken = shape.count(BASE_NUMMERBLOKKEN)
+
+    # --- Nummerblokken: aaneengesloten ranges van 100 nummers, Eindreeks als suffix ---
+    blokken = []
+    for i in range(n_blokken):
+        start = 202000000 + i * 100
+        blokken.append((f"+31 {start}", "99", f"Blok {i + 1:03d}", start))
+
+    # --- Gebruikers ---
+    users = []
+    for i in range(n_users):
+        number = str(1000 + i)
+        first, last = r.choice(FIRST_NAMES), r.choice(LAST_NAMES)
+        dids = [f"0{r.choice(blokken)[3] + r.randrange(100)}" for _ in range(r.randint(0, shape.dids_per_user))]
+        outbound = f"+31{r.choice(blokken)[3] + r.randrange(100)}" if r.random() < 0.7 else ""
+        users.append((number, f"{first} {last} {number}", first, f"{last} {number}", r.choice(DEPARTMENTS),
+                      ":".join(dids), outbound, f"06{r.randrange(10 ** 8):08d}" if r.random() < 0.5 else "",
+                      f"{first.lower()}.{number}@voorbeeld.nl"))
+    user_names = [user[1] for user in users]
+
+    def user_dest():
+        user = r.choice(users)
+        return f"Gebruiker({user[0]} {user[1]})" if r.random() < 0.8 else f"Voicemail({user[0]} {user[1]})"
+
+    # --- Wachtrijen en belgroepen ---
+    queue_exts = [str(8000 + i) for i in range(n_queues)]
+    ringgroup_exts = [str(8000 + n_queues + i) for i in range(n_ringgroups)]
+
+    def group_dest():
+        if r.random() < 0.6:
+            ext = r.choice(queue_exts)
+            return f"Wachtrij({ext} Wachtrij {ext})"
+        ext = r.choice(ringgroup_exts)
+        return f"Belgroep({ext} Belgroep {ext})"
+
+    def fallback_dest():
+        k = r.random()
+        if k < 0.4: return group_dest()
+        if k < 0.7: return user_dest()
+        if k < 0.85: return f"+31 20 {r.randrange(10 ** 7):07d}"
+        return "End Call"
+
+    queues = []
+    for ext in queue_exts:
+        members = r.sample(user_names, min(shape.queue_size, len(user_names)))
+        queues.append(([ext, f"Wachtrij {ext}", r.choice([15, 20, 30]), r.choice([60, 120, 300]), fallback_dest()], members))
+    ringgroups = []
+    for ext in ringgroup_exts:
+        members = r.sample(user_names, min(shape.ringgroup_size, len(user_names)))
+        ringgroups.append(([ext, f"Belgroep {ext}", r.choice([15, 20, 30]), fallback_dest()], members))
+
+    # --- Digital Receptionists: per Onderdeel een boom van geneste DR's ---
+    dr_rows = []
+    next_ext = [600]
+
+    def new_dr(onderdeel, rol, parent_ext, level):
+        ext = str(next_ext[0]); next_ext[0] += 1
+        row = dict.fromkeys(DR_COLUMNS, "")
+        row.update({"Onderdeel": onderdeel, "Primair/Secundair": rol, "Digital Receptionist Name": f"{onderdeel} IVR {ext}",
+                    "Virtual Extension Number": ext, "If no input within seconds": r.choice([5, 10, 15])})
+        dr_rows.append(row)
+        n_options = r.randint(2, 6)
+        children = shape.fanout if level < shape.depth else 0
+        for option in range(1, n_options + 1):
+            if option <= children:
+                child = new_dr(onderdeel, "Secundair", ext, level + 1)
+                row[f"Menu {option}"] = f"DigitalReceptionist({child} {onderdeel} IVR {child})"
+            else:
+                row[f"Menu {option}"] = group_dest() if r.random() < 0.7 else user_dest()
+        if parent_ext and r.random() < shape.cycles:
+            row["Menu 9"] = f"DigitalReceptionist({parent_ext} terug)"  # Cyclus naar de bovenliggende DR
+        row["Menu 0"] = user_dest()
+        row["When office is closed route to"] = f"Voicemail({r.choice(users)[0]})"
+        row["When on break route to"] = row["When on holiday route to"] = r.choice(["End Call", fallback_dest()])
+        row["Send call to"] = ""
+        row["Invalid input destination"] = "Repeat Prompt" if r.random() < 0.5 else f"{ext} {onderdeel} IVR {ext}"
+        return ext
+
+    # Elke Onderdeel-boom heeft (fanout^(depth+1) - 1) / (fanout - 1) DR's; het aantal bomen volgt de schaal
+    for i in range(n_onderdelen):
+        new_dr(f"Onderdeel {i + 1:03d}", "Primair", None, 1)
+    n_individual = int(len(dr_rows) * shape.individual_drs)
+    for i in range(n_individual):
+        new_dr(r.choice(["?", ""]), "", None, shape.depth)
+
+    # --- CSV's ---
+    max_queue = max((len(members) for _, members in queues), default=0)
+    max_ringgroup = max((len(members) for _, members in ringgroups), default=0)
+    files = {
+        "Receptionists.csv": _csv(DR_COLUMNS, [[row[col] for col in DR_COLUMNS] for row in dr_rows]),
+        "Queues.csv": _csv(["Virtual Extension Number", "Queue Name", "Ring time (s)", "Max queue wait time (s)",
+                            "Destination if no answer"] + [f"User {i}" for i in range(1, max_queue + 1)],
+                           [row + members + [""] * (max_queue - len(members)) for row, members in queues]),
+        "ringgroups.csv": _csv(["Virtual Extension Number", "Ring Group Name", "Ring time (s)", "Destination if no answer"]
+                               + [f"User {i}" for i in range(1, max_ringgroup + 1)],
+                               [row + members + [""] * (max_ringgroup - len(members)) for row, members in ringgroups]),
+        "Users.csv": _csv(["Number", "Full Name", "FirstName", "LastName", "Department", "DID", "OutboundCallerID",
+                           "MobileNumber", "EmailAddress"], users),
+        "trunksreeksen.csv": _csv(["Startreeks", "Eindreeks", "Nummerblok"], [blok[:3] for blok in blokken]),
+    }
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for filename, content in files.items():
+            zf.writestr(filename, content.encode("utf-8"))
+    counts = {"users": len(users), "drs": len(dr_rows), "queues": len(queues), "ringgroups": len(ringgroups),
+              "nummerblokken": len(blokken)}
+    return buf.getvalue(), counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genereer een synthetische 3CX-export (ZIP) voor benchmarks.")
+    parser.add_argument("-o", "--output", default="synthetisch.zip", help="Uitvoerbestand (standaard: synthetisch.zip)")
+    parser.add_argument("--scale", type=float, default=1, help=f"Schaalfactor; 1 = {BASE_USERS} gebruikers")
+    parser.add_argument("--seed", type=int, default=0, help="Seed voor de random generator")
+    defaults = ExportShape()
+    parser.add_argument("--depth", type=int, default=defaults.depth, help="Niveaus geneste DR's per Onderdeel")
+    parser.add_argument("--fanout", type=int, default=defaults.fanout, help="Sub-DR's per DR")
+    parser.add_argument("--cycles", type=float, default=defaults.cycles, help="Fractie DR's met een lus terug")
+    parser.add_argument("--queue-size", type=int, default=defaults.queue_size, help="Leden per wachtrij")
+    args = parser.parse_args(argv)
+
+    shape = ExportShape(scale=args.scale, depth=args.depth, fanout=args.fanout, cycles=args.cycles,
+                        queue_size=args.queue_size)
+    zip_bytes, counts = generate_export(shape, seed=args.seed)
+    with open(args.output, "wb") as f:
+        f.write(zip_bytes)
+    print(f"{args.output}: " + ", ".join(f"{n} {soort}" for soort, n in counts.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
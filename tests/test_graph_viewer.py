@@ -0,0 +1,21 @@
+import json
+import re
+
+from flows import Flow
+from graph_viewer import viewer_html
+
+
+def test_viewer_html_keeps_placeholder_tokens_in_labels():
+    flow = Flow("flow __OPTIONS__", "")
+    flow.node("a", "DR __HEIGHT__ </script>", "DR", shape="box", fillcolor="#fff")
+    flow.node("b", "Wachtrij __GRAPH__", "Queue", shape="box", fillcolor="#fff")
+    flow.edge("a", "b", "__OPTIONS__")
+    html = viewer_html(flow, height=321)
+    raw = re.search(r"const RAW = (.*);\n", html).group(1)
+    assert "</script>" not in raw  # Label kan de <script>-tag niet afsluiten
+    graph = json.loads(raw.replace("<\\/", "</"))
+    assert graph["name"] == "flow __OPTIONS__"
+    assert graph["labels"] == ["DR __HEIGHT__ </script>", "Wachtrij __GRAPH__"]
+    assert graph["edges"] == [[0, 1, "__OPTIONS__"]]
+    assert "height: 321px" in html
+    assert json.loads(re.search(r"const OPT = (.*);\n", html).group(1))["height"] == 321
@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from nummers import NummerblokIndex, normalize_nl_number, normalize_nl_numbers
+
+NUMMERS = ["0201234567", "+31 20 123 4567", "+31 (0)20 1234567", "0031201234567", "201234567", "31201234567",
+           "0612345678", "*0612345678", "00491234567", "1001", " 1001 ", "0", "00", "+", "", "   ", "abc",
+           "020-1234567", "12a4", "(0)", "0049 30 1234567", "123456789012345678", "1234567890123456789",
+           "00" + "9" * 25, float("nan"), None, 612345678]
+
+
+def _linear_scan(ranges, number):
+    """Oorspronkelijke lookup: de eerste range in gesorteerde volgorde waar het nummer in valt."""
+    return next((blok for start, end, blok in sorted(ranges) if start <= number <= end), None)
+
+
+def test_normalize_nl_numbers_matches_scalar():
+    result = normalize_nl_numbers(pd.Series(NUMMERS, dtype=object))
+    for value, column_value in zip(NUMMERS, result):
+        expected = normalize_nl_number(value)
+        if expected is None or len(str(expected)) > 18:  # Past niet gegarandeerd in Int64
+            assert column_value is pd.NA, value
+        else:
+            assert column_value == expected, value
+
+
+def test_normalize_nl_numbers_keeps_index():
+    numbers = pd.Series(["0201234567", "x"], index=[10, 3])
+    result = normalize_nl_numbers(numbers)
+    assert list(result.index) == [10, 3]
+    assert str(result.dtype) == "Int64"
+
+
+def test_nummerblok_index_matches_linear_scan_with_overlap():
+    r = random.Random(1)
+    ranges = []
+    for i in range(60):
+        start = 31200000000 + r.randrange(2000)
+        ranges.append((start, start + r.randrange(300), f"Blok {i % 7}"))
+    ranges += [(31200000500, 31200000500, "Enkel"), (31200000400, 31200001500, "Groot")]
+    index = NummerblokIndex(ranges)
+    numbers = list(range(31199999990, 31200002500, 3)) + [end for _, end, _ in ranges] + [end + 1 for _, end, _ in ranges]
+    expected = [_linear_scan(ranges, number) for number in numbers]
+    assert [index.lookup(number) for number in numbers] == expected
+    assert list(index.lookup_many(numbers)) == expected
+    assert list(index.lookup_many(pd.Series(numbers, dtype="Int64"))) == expected
+    assert list(index.lookup_many(pd.Series([None, numbers[0]], dtype="Int64"))) == [None, expected[0]]
+    assert list(index.lookup_many([int(np.iinfo(np.int64).max) + 1, -2 ** 70])) == [None, None]  # Buiten Int64
+
+
+def test_nummerblok_index_beyond_int64():
+    big = int(np.iinfo(np.int64).max) + 10
+    ranges = [(100, 200, "Klein"), (big - 20, big, "Groot"), (150, big + 5, "Breed")]
+    index = NummerblokIndex(ranges)
+    numbers = [99, 100, 175, 201, big - 21, big - 20, big, big + 5, big + 6, None]
+    expected = [None if number is None else _linear_scan(ranges, number) for number in numbers]
+    assert [index.lookup(number) for number in numbers] == expected
+    assert list(index.lookup_many(numbers)) == expected
+
+
+def test_empty_index():
+    index = NummerblokIndex([])
+    assert not index
+    assert index.lookup(31201234567) is None
+    assert list(index.lookup_many([31201234567, None])) == [None, None]
@@ -0,0 +1,93 @@
+from collections import deque
+
+import pandas as pd
+
+import ingest
+import synth_export
+from callgraph import build_call_graph_model
+from reachability import ReachabilityEngine
+
+
+def _small_model():
+    """
+    DR 900 -> wachtrij 800 (Anna) -> no answer DR 900: cyclus.
+    DR 900 -> belgroep 700 (Bram) -> no answer DR 901 -> terug naar DR 900 (cyclus) en gebruiker 103.
+    DR 902 -> wachtrij 800; gebruiker 104 is nergens bereikbaar.
+    """
+    users = pd.DataFrame({"Number": ["101", "102", "103", "104"], "Naam": ["Anna", "Bram", "Cor", "Dirk"]})
+    queues = pd.DataFrame({"Virtual Extension Number": ["800"], "Queue Name": ["Sales Q"],
+                           "Destination if no answer": ["IVR(900 Hoofdmenu)"], "User 1": ["Anna"]})
+    ringgroups = pd.DataFrame({"Virtual Extension Number": ["700"], "Ring Group Name": ["Balie"],
+                               "Destination if no answer": ["901"], "User 1": ["Bram"], "User 2": ["Onbekend"]})
+    receptionists = pd.DataFrame({
+        "Onderdeel": ["A", "A", "B"], "Virtual Extension Number": ["900", "901", "902"],
+        "Digital Receptionist Name": ["Hoofdmenu", "Nacht", "Los"],
+        "Menu 1": ["Wachtrij(800 Sales Q)", "IVR(900 Hoofdmenu)", "800"],
+        "Send call to": ["Belgroep(700 Balie)", None, None],
+        "When office is closed route to": [None, "103", None],
+    })
+    return build_call_graph_model({"users": users, "queues": queues, "ringgroups": ringgroups,
+                                   "receptionists_all": receptionists})
+
+
+def _nodes(model):
+    return ([("Queue", ext) for ext in model.queues_by_ext] + [("RingGroup", ext) for ext in model.ringgroups_by_ext]
+            + [("DR", ext) for ext in model.drs_by_ext])
+
+
+def _bfs_users(engine, model, start):
+    """Referentie zonder componenten: gewone BFS over de bestemmingen vanaf één knoop."""
+    seen, users, queue = {start}, set(), deque([start])
+    while queue:
+        kind, ext = queue.popleft()
+        if kind == "DR":
+            targets = [engine.resolve(dest) for dest in model.dr(ext).parsed_destinations.values()]
+        else:
+            group = model.queue(ext) if kind == "Queue" else model.ringgroup(ext)
+            users.update(member.number for _, member in model.group_members(group) if member is not None)
+            targets = [engine.resolve(group.no_answer_parsed)] if pd.notna(group.no_answer_dest) else []
+        for target in targets:
+            if target is None: continue
+            if target[0] == "User":
+                users.add(target[1].number)
+            elif target not in seen:
+                seen.add(target)
+                queue.append(target)
+    return users
+
+
+def _numbers(users):
+    return {user[0] for user in users}
+
+
+def test_cyclic_graph():
+    model = _small_model()
+    engine = ReachabilityEngine(model)
+    everyone = {"101", "102", "103"}
+    for node in (("DR", "900"), ("DR", "901"), ("Queue", "800"), ("RingGroup", "700")):
+        assert _numbers(engine.reachable_users(node)) == everyone, node
+    assert _numbers(engine.reachable_users(("DR", "902"))) == everyone
+    assert engine.reaching({("DR", "900")}) == {("DR", "900"), ("DR", "901"), ("DR", "902"), ("Queue", "800"), ("RingGroup", "700")}
+    assert engine.reaching({("DR", "902")}) == {("DR", "902")}
+    assert not engine.paths_to_user("104")
+    assert engine.is_reachable("103", [("DR", "902")])
+    assert not engine.is_reachable("104", [("DR", "900")])
+    # Kortste route van DR 902 naar Cor: 902 -> 800 -> 900 -> 700 -> 901
+    path = next(path for path in engine.paths_to_user("103") if path.entry == ("DR", "902"))
+    assert path.path == (("DR", "902"), ("Queue", "800"), ("DR", "900"), ("RingGroup", "700"), ("DR", "901"))
+    member = next(path for path in engine.paths_to_user("102") if path.entry == ("RingGroup", "700"))
+    assert member.member_name == "Bram" and member.path == (("RingGroup", "700"),)
+    # De streaming traversal vindt dezelfde gebruikers
+    assert {user.number for user, _, _ in engine.traverse([("DR", "902")])} == everyone
+
+
+def test_matches_bfs_on_synthetic_export():
+    shape = synth_export.ExportShape(scale=2, cycles=0.3)
+    data = ingest.load_data_from_zip(synth_export.generate_export(shape, seed=7)[0], report=lambda *_: None)
+    model, engine = data["model"], data["reachability"]
+    for node in _nodes(model):
+        assert _numbers(engine.reachable_users(node)) == _bfs_users(engine, model, node), node
+    # Elke route van paths_to_user hoort bij een ingang die de gebruiker ook via BFS bereikt
+    for number in list(engine.user_numbers())[:50]:
+        for path in engine.paths_to_user(number):
+            assert number in _bfs_users(engine, model, path.entry)
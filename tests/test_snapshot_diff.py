@@ -0,0 +1,61 @@
+import io
+import pickle
+import zipfile
+
+import pandas as pd
+
+import ingest
+import synth_export
+from snapshot_diff import diff_snapshots
+
+
+def _load(zip_bytes):
+    return ingest.load_data_from_zip(zip_bytes, report=lambda *_: None)
+
+
+def _with_receptionists(zip_bytes, edit):
+    """Kopie van de export waarin `edit(df)` Receptionists.csv aanpast."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zin, zipfile.ZipFile(out, "w") as zout:
+        for name in zin.namelist():
+            raw = zin.read(name)
+            if name.endswith("Receptionists.csv"):
+                df = pd.read_csv(io.BytesIO(raw), sep=";", dtype=str, keep_default_na=False)
+                edit(df)
+                raw = df.to_csv(sep=";", index=False).encode("utf-8")
+            zout.writestr(name, raw)
+    return out.getvalue()
+
+
+def test_diff_against_pickled_copy_is_empty():
+    # Snapshot- en Streamlit-caches picklen de data; NaN-waarden mogen dan geen wijziging lijken
+    zip_bytes, _ = synth_export.generate_export()
+    data = _load(zip_bytes)
+    diff = diff_snapshots(data, pickle.loads(pickle.dumps(data)))
+    assert not diff
+    assert not diff.flows and not diff.onderdelen and not diff.users
+
+
+def test_changed_dr_destination():
+    zip_bytes, _ = synth_export.generate_export()
+    old = _load(zip_bytes)
+    dr = next(dr for dr in old["model"].drs if dr.primair_secundair == "Primair")
+    onderdeel, ext = dr.onderdeel, dr.ext
+    # Een gebruiker die het Onderdeel nog niet bereikt, direct achter 'kantoor gesloten'
+    reached = {user[0] for user in old["reachability"].users_reachable_from(
+        dest_key for record in old["model"].drs if record.onderdeel == onderdeel
+        for dest_key in record.parsed_destinations.values())}
+    number = next(number for number in sorted(old["model"].users_by_number) if number not in reached)
+
+    def edit(df):
+        df.loc[df["Virtual Extension Number"] == ext, "When office is closed route to"] = number
+    new = _load(_with_receptionists(zip_bytes, edit))
+
+    diff = diff_snapshots(old, new)
+    assert diff.changed["DR"] == [ext]
+    assert not any(diff.added.values()) and not any(diff.removed.values())
+    assert diff.changed["User"] == diff.changed["Queue"] == diff.changed["RingGroup"] == []
+    assert ("DR", ext) in diff.highlight
+    assert diff.flows[("Onderdeel", onderdeel)] == "gewijzigd"
+    assert number in diff.onderdelen[onderdeel][0]
+    assert number in diff.users
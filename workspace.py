@@ -0,0 +1,129 @@
+"""
+Werkruimte met meerdere 3CX-exports naast elkaar, één per PBX (bedrijfsonderdeel).
+
+Elke export wordt in een thread pool ingelezen en geïndexeerd via
+`ingest.load_snapshot`, dus met dezelfde snapshot-, render- en parsercaches als
+een enkele upload. Daarna worden identieke strings, rijen en gebruikers-tuples
+tussen de exports gedeeld: een gebruiker of label dat in meerdere PBX'en
+voorkomt staat dan één keer in het geheugen (ook na pickle, zolang de
+werkruimte als geheel wordt gepickled).
+
+Onafhankelijk van Streamlit; de meldingen per export worden verzameld en
+teruggegeven zodat de aanroeper ze in de eigen thread kan tonen.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import pandas as pd
+
+import ingest
+import instrument
+
+ALLE_PBXEN = "Alle PBX'en"
+
+
+def unique_names(names):
+    """Maakt PBX-namen uniek met een volgnummer: 'a', 'a (2)', 'a (3)', ..."""
+    seen = {}
+    result = []
+    for name in names:
+        count = seen[name] = seen.get(name, 0) + 1
+        result.append(name if count == 1 else f"{name} ({count})")
+    return result
+
+
+def _load_one(zip_file_bytes, zip_sha256):
+    meldingen = []
+    data = ingest.load_snapshot(zip_file_bytes, report=lambda niveau, tekst: meldingen.append((niveau, tekst)),
+                                zip_sha256=zip_sha256)
+    return data, meldingen
+
+
+def load_workspace(exports, workers=None):
+    """
+    Leest meerdere exports parallel in en deelt daarna gedeelde structuren.
+    exports: lijst van (naam, zip_bytes, zip_sha256 of None) met unieke namen.
+    Returns: tuple (dict naam -> all_data, dict naam -> [(niveau, tekst)]), in
+    invoervolgorde; exports die niet geladen konden worden ontbreken in de eerste dict.
+    """
+    exports = list(exports)
+    workspace, meldingen = {}, {}
+    if not exports:
+        return workspace, meldingen
+    with ThreadPoolExecutor(max_workers=workers or min(len(exports), os.cpu_count() or 1)) as pool:
+        futures = [(naam, pool.submit(instrument.in_context(_load_one), zip_bytes, zip_sha256))
+                   for naam, zip_bytes, zip_sha256 in exports]
+        for naam, future in futures:
+            data, meldingen[naam] = future.result()
+            if data:
+                workspace[naam] = data
+    if len(workspace) > 1:
+        with instrument.span("share_across"): share_across(workspace.values())
+    return workspace, meldingen
+
+
+def share_across(datasets):
+    """
+    Deelt identieke objecten tussen de modellen van meerdere exports: strings
+    (namen, extensies, kolomnamen), complete rijen van gebruikers, DR's,
+    wachtrijen en belgroepen, en de gebruikers-tuples in de bereikbaarheidssets.
+    De records zelf blijven per export, omdat de indexen van elk model naar de
+    eigen records verwijzen.
+    Returns: aantal rijen dat door een gedeelde rij is vervangen.
+    """
+    strings, rows, tuples = {}, {}, {}
+    intern = strings.setdefault  # Waarden zijn strings of NaN (read_export_csv), dus veilig als sleutel
+    shared_rows = 0
+
+    def string(value):
+        return intern(value, value) if type(value) is str else value
+
+    def row(values):
+        nonlocal shared_rows
+        # pandas geeft voor elke lege cel hetzelfde np.nan object, dus gelijke rijen geven gelijke sleutels
+        key = tuple(values.items())
+        shared = rows.get(key)
+        if shared is None:
+            keys, vals = list(values), list(values.values())
+            shared = rows[key] = dict(zip(map(intern, keys, keys), map(intern, vals, vals)))
+        else:
+            shared_rows += 1
+        return shared
+
+    def user_tuple(values):
+        values = tuple(map(intern, values, values))
+        return tuples.setdefault(values, values)
+
+    for data in datasets:
+        model = data.get("model")
+        if model is None:
+            continue
+        # Via de naam-indexen kan een record bereikbaar zijn dat niet in de extensie-index staat
+        users = {id(record): record for record in chain(model.users_by_number.values(), model.users_by_name.values())}
+        for record in users.values():
+            record.row, record.number, record.naam = row(record.row), string(record.number), string(record.naam)
+        drs = {id(record): record for record in chain(model.drs, model.drs_by_ext.values(), model.drs_by_name.values())}
+        for record in drs.values():
+            record.row, record.ext, record.name = row(record.row), string(record.ext), string(record.name)
+        groups = {id(record): record for record in chain(
+            model.queues_by_ext.values(), model.queues_by_name.values(),
+            model.ringgroups_by_ext.values(), model.ringgroups_by_name.values())}
+        for record in groups.values():
+            record.row, record.ext, record.name = row(record.row), string(record.ext), string(record.name)
+            record.members = [string(naam) for naam in record.members]
+        engine = data.get("reachability")
+        if engine is not None:
+            engine.share_user_tuples(user_tuple)
+    return shared_rows
+
+
+def combine_tables(tables):
+    """
+    Plakt de tabellen van meerdere PBX'en onder elkaar, met een kolom 'PBX' vooraan.
+    Bij één PBX wordt de tabel ongewijzigd teruggegeven.
+    tables: lijst van (pbx_naam, DataFrame)
+    """
+    if len(tables) == 1:
+        return tables[0][1]
+    return pd.concat([df.assign(PBX=naam)[["PBX"] + list(df.columns)] for naam, df in tables], ignore_index=True)